@@ -1,12 +1,67 @@
 # app.py
-import pandas as pd
-import numpy as np
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import importlib
 import logging
+import math
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from vnstock import Vnstock
-from vnstock.explorer.vci import Company
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask_cors import CORS
+from relative_valuation import SectorAggregates
+
+
+class _LazyModule:
+    """Import a heavy module on first attribute access instead of at startup"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# pandas/numpy are only pulled in by the first request or by the warm-up thread
+pd = _LazyModule("pandas")
+np = _LazyModule("numpy")
+
+# Comma separated tickers pre-fetched by the background warm-up, e.g. "VCB,FPT,VNM"
+HOT_SYMBOLS = [s.strip().upper() for s in os.environ.get("HOT_SYMBOLS", "").split(",") if s.strip()]
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "1") == "1"
+FUNDAMENTALS_TTL = int(os.environ.get("FUNDAMENTALS_TTL", "3600"))  # seconds
+# Node-local directory (e.g. /dev/shm) for the cross-worker cache; empty keeps caches per process
+SHARED_CACHE_DIR = os.environ.get("SHARED_CACHE_DIR", "")
+# How often the refresher worker renews shared fundamentals that are close to expiring
+SHARED_REFRESH_INTERVAL = int(os.environ.get("SHARED_REFRESH_INTERVAL", "60"))  # seconds
+# Fetched rows are published to the shared table this many at a time
+SHARED_PUBLISH_BATCH = int(os.environ.get("SHARED_PUBLISH_BATCH", "64"))
+# Shared fundamentals not read by any worker for this long stop being refreshed and are dropped
+SHARED_HOT_WINDOW = int(os.environ.get("SHARED_HOT_WINDOW", str(3 * FUNDAMENTALS_TTL)))  # seconds
+# Where batch_jobs.py writes the nightly valuation snapshots
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshots")
+
+# Numeric fields of _get_vci_data kept in the shared fundamentals table
+VCI_NUMERIC_FIELDS = [
+    "revenue_ttm", "net_income_ttm", "revenue_growth", "net_profit_margin", "gross_margin",
+    "roe", "roa", "roic", "pe_ratio", "pb_ratio", "ps_ratio", "pcf_ratio", "ev_ebitda",
+    "eps", "eps_ttm", "bvps", "debt_to_equity", "current_ratio", "quick_ratio", "cash_ratio",
+    "enterprise_value", "shares_outstanding", "charter_capital", "ebitda", "ebit", "ebit_margin",
+    "dividend_per_share", "year_report", "update_date", "total_assets", "total_debt", "total_liabilities",
+]
+
+# Upper bound on an explicit symbols list for GET /api/implied (each one may need a VCI fetch)
+MAX_IMPLIED_SYMBOLS = 200
+
+# Price board columns in priority order (multi-index tuples as returned by VCI)
+PRICE_BOARD_FIELDS = [
+    ('match', 'match_price'),
+    ('listing', 'ref_price'),
+    ('bid_ask', 'bid_1_price'),
+    ('match', 'close_price'),
+    ('match', 'last_price')
+]
 
 app = Flask(__name__)
 CORS(app)
@@ -20,28 +75,358 @@ logger = logging.getLogger(__name__)
 class StockDataProvider:
     def __init__(self):
         self.sources = ["VCI"]  # Only use VCI source as requested
-        self.vnstock = Vnstock()
+        self._vnstock = None  # Created on first use so import stays cheap
         self._all_symbols = None  # Lazy-load symbols list
+        self._symbols_lock = threading.Lock()
+        self._fundamentals_cache = {}  # symbol -> (fetched_at, vci_data)
+        self._sector_map = None  # symbol -> ICB sector name, lazy-loaded
+        self.sector_aggregates = SectorAggregates()
+        # Where each symbol's aggregate row came from: a snapshot version, or None for live data
+        self._aggregate_origin = {}
+        self._aggregate_fetched_at = {}  # symbol -> fetched_at of the live row last folded in
+        self._aggregate_versions = {}  # "snapshot"/"shared" -> version last folded in
+        self._aggregates_lock = threading.Lock()
+        self._shared_symbols = None
+        self._shared_fundamentals = None
+        self._pending_publish = {}  # symbol -> row waiting for the next batched publish
+        self._pending_since = None
+        self._publish_lock = threading.Lock()
+        self._accessed = {}  # symbol -> last read by this worker, not yet shared
+        self._shared_access = None
+        if SHARED_CACHE_DIR:
+            from shared_cache import SharedTable
+            self._shared_symbols = SharedTable("symbols", [], SHARED_CACHE_DIR)
+            self._shared_fundamentals = SharedTable("fundamentals", VCI_NUMERIC_FIELDS + ["fetched_at"], SHARED_CACHE_DIR)
+            # Last read of each shared symbol by any worker, so the refresher only renews what is in use
+            self._shared_access = SharedTable("access", ["accessed_at"], SHARED_CACHE_DIR)
         logger.info("StockDataProvider initialized with VCI source only (symbols will be loaded on first request)")
 
+    @property
+    def vnstock(self):
+        if self._vnstock is None:
+            from vnstock import Vnstock
+            self._vnstock = Vnstock()
+        return self._vnstock
+
     def _get_all_symbols(self):
         """Lazy-load symbols list only when needed"""
         if self._all_symbols is not None:
             return self._all_symbols
-            
-        logger.info("Loading symbols list for the first time...")
-        try:
-            stock = self.vnstock.stock(symbol="ACB", source="VCI")
-            symbols_df = stock.listing.all_symbols()
-            self._all_symbols = symbols_df["symbol"].str.upper().values
-            logger.info(f"Successfully loaded {len(self._all_symbols)} symbols from VCI")
+
+        # Warm-up thread and request threads may race here; only one loads the list
+        with self._symbols_lock:
+            if self._all_symbols is not None:
+                return self._all_symbols
+
+            if self._shared_symbols is not None:
+                shared = self._shared_symbols.symbols()
+                if shared:
+                    self._all_symbols = np.array(shared)
+                    logger.info(f"Loaded {len(shared)} symbols from shared cache")
+                    return self._all_symbols
+
+            logger.info("Loading symbols list for the first time...")
+            try:
+                stock = self.vnstock.stock(symbol="ACB", source="VCI")
+                symbols_df = stock.listing.all_symbols()
+                self._all_symbols = symbols_df["symbol"].str.upper().values
+                logger.info(f"Successfully loaded {len(self._all_symbols)} symbols from VCI")
+                if self._shared_symbols is not None:
+                    self._shared_symbols.publish({s: {} for s in self._all_symbols}, replace=True)
+                return self._all_symbols
+            except Exception as e:
+                logger.warning(f"Failed to get symbols list from VCI: {e}")
+
+            logger.error("Failed to fetch symbols from VCI source.")
+            self._all_symbols = []
             return self._all_symbols
-        except Exception as e:
-            logger.warning(f"Failed to get symbols list from VCI: {e}")
-        
-        logger.error("Failed to fetch symbols from VCI source.")
-        self._all_symbols = []
-        return self._all_symbols
+
+    def _get_sector_map(self) -> dict:
+        """Lazy-load the ICB sector of every listed symbol (one listing call for the whole market)"""
+        if self._sector_map is not None:
+            return self._sector_map
+
+        with self._symbols_lock:
+            if self._sector_map is not None:
+                return self._sector_map
+            sector_map = {}
+            try:
+                stock = self.vnstock.stock(symbol="ACB", source="VCI")
+                industries_df = stock.listing.symbols_by_industries()
+                sector_fields = [f for f in ["icb_name2", "icb_name3", "icb_name4", "industry", "industryName"]
+                                 if f in industries_df.columns]
+                for _, row in industries_df.iterrows():
+                    for f in sector_fields:
+                        if pd.notna(row[f]) and str(row[f]).strip():
+                            sector_map[str(row["symbol"]).upper()] = str(row[f])
+                            break
+                logger.info(f"Loaded ICB sectors for {len(sector_map)} symbols")
+            except Exception as e:
+                logger.warning(f"Failed to load sector listing from VCI: {e}")
+            self._sector_map = sector_map
+            return self._sector_map
+
+    def _update_aggregates(self, symbol: str, data: dict, fetched_at: float) -> None:
+        """Fold live fundamentals into the sector aggregates; snapshots never override them"""
+        self.sector_aggregates.update(symbol, self.get_sector(symbol), data)
+        self._aggregate_origin[symbol] = None
+        self._aggregate_fetched_at[symbol] = fetched_at
+
+    def sync_sector_aggregates(self) -> None:
+        """
+        Fold market-wide fundamentals into the sector aggregates, not just the symbols this
+        worker fetched. Rows of the latest nightly snapshot replace rows that came from an
+        older snapshot (never live data), and shared-table rows are folded in when their
+        fetched_at changed. Runs in the warm-up/maintenance thread, never in a request.
+        """
+        sector_map = self._get_sector_map()
+        with self._aggregates_lock:
+            try:
+                store = get_snapshot_store()
+                version = store.latest_version()
+                if version and version != self._aggregate_versions.get("snapshot"):
+                    self._aggregate_versions["snapshot"] = version
+                    frame = store.load(version)
+                    for symbol, row in zip(frame.index, frame.to_dict(orient="records")):
+                        origin = self._aggregate_origin.get(symbol, "")
+                        if origin is not None and origin < version:
+                            self.sector_aggregates.update(symbol, sector_map.get(symbol, row.get("sector", "Unknown")), row)
+                            self._aggregate_origin[symbol] = version
+            except Exception as e:
+                logger.warning(f"Could not seed sector aggregates from snapshot: {e}")
+
+            if self._shared_fundamentals is None or \
+                    self._shared_fundamentals.version == self._aggregate_versions.get("shared"):
+                return
+            self._aggregate_versions["shared"] = self._shared_fundamentals.version
+            symbols, values = self._shared_fundamentals.to_arrays()
+            fields = self._shared_fundamentals.fields
+            fetched_index = fields.index("fetched_at")
+            for symbol, row in zip(symbols, values.tolist()):
+                if self._aggregate_fetched_at.get(symbol) == row[fetched_index]:
+                    continue
+                self.sector_aggregates.update(symbol, sector_map.get(symbol, "Unknown"), dict(zip(fields, row)))
+                self._aggregate_origin[symbol] = None
+                self._aggregate_fetched_at[symbol] = row[fetched_index]
+
+    def get_sector(self, symbol: str) -> str:
+        return self._get_sector_map().get(symbol.upper(), "Unknown")
+
+    def get_relative_valuation(self, symbol: str) -> dict:
+        data = self.get_stock_data(symbol)
+        result = self.sector_aggregates.relative_valuation(data["symbol"], data["sector"], data)
+        result["success"] = True
+        return result
+
+    def cached_symbols(self) -> list:
+        """Symbols whose fundamentals are already held in process or in the shared cache"""
+        symbols = set(self._fundamentals_cache)
+        if self._shared_fundamentals is not None:
+            symbols.update(self._shared_fundamentals.symbols())
+        return sorted(symbols)
+
+    def cached_fundamentals(self) -> dict:
+        """
+        Unexpired fundamentals already held in process or in the shared cache, read directly:
+        expired rows are skipped rather than refetched, so this never calls VCI
+        """
+        now = time.time()
+        fundamentals = {}
+        if self._shared_fundamentals is not None:
+            symbols, values = self._shared_fundamentals.to_arrays()
+            fields = self._shared_fundamentals.fields
+            fresh = now - values[:, fields.index("fetched_at")] < FUNDAMENTALS_TTL
+            for symbol, is_fresh, row in zip(symbols, fresh.tolist(), values.tolist()):
+                if is_fresh:
+                    data = dict(zip(fields, row))
+                    data.pop("fetched_at")
+                    fundamentals[symbol] = {**data, "data_source": "VCI", "success": True}
+        for symbol, (fetched_at, data) in list(self._fundamentals_cache.items()):
+            if now - fetched_at < FUNDAMENTALS_TTL:
+                fundamentals[symbol] = dict(data)
+        return fundamentals
+
+    def get_fundamentals_batch(self, symbols, max_workers: int = 8) -> dict:
+        """Fundamentals for many symbols with bounded concurrency; failed symbols are left out"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        def fetch(symbol):
+            try:
+                return symbol, self._get_cached_vci_data(symbol)
+            except Exception as e:
+                logger.warning(f"Fundamentals fetch failed for {symbol}: {e}")
+                return symbol, {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(fetch, [s.upper() for s in symbols]))
+        self.flush_shared_publishes()
+        return {symbol: data for symbol, data in results if data and data.get('success')}
+
+    def get_price_board(self, symbols, chunk_size: int = 100) -> dict:
+        """Current prices for many symbols using one price_board call per chunk"""
+        prices = {}
+        stock = self.vnstock.stock(symbol="ACB", source="VCI")
+        symbols = [s.upper() for s in symbols]
+        for start in range(0, len(symbols), chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            try:
+                board = stock.trading.price_board(chunk)
+            except Exception as e:
+                logger.warning(f"Price board failed for {len(chunk)} symbols: {e}")
+                continue
+            has_symbol_col = ('listing', 'symbol') in board.columns
+            for i in range(len(board)):
+                symbol = str(board[('listing', 'symbol')].iloc[i]).upper() if has_symbol_col else chunk[i]
+                for field in PRICE_BOARD_FIELDS:
+                    if field in board.columns:
+                        price_val = board[field].iloc[i]
+                        if pd.notna(price_val) and price_val > 0:
+                            prices[symbol] = float(price_val)
+                            break
+        return prices
+
+    def get_implied_parameters(self, symbols, assumptions=None, model: str = "dcf",
+                               solve_for: str = "revenue_growth", fetch_missing: bool = True) -> list:
+        """
+        Reverse DCF for many symbols: one vectorized solve over every symbol that has
+        both fundamentals and a price. With fetch_missing=False only cached fundamentals are used.
+        """
+        from valuation_models import implied_parameter_batch
+
+        symbols = [s.upper() for s in symbols]
+        if fetch_missing:
+            fundamentals = self.get_fundamentals_batch(symbols)
+        else:
+            cached = self.cached_fundamentals()
+            fundamentals = {s: cached[s] for s in symbols if s in cached}
+        prices = self.get_price_board(list(fundamentals))
+        solvable = [s for s in fundamentals if s in prices]
+        if not solvable:
+            return []
+
+        result = implied_parameter_batch(
+            [fundamentals[s] for s in solvable], [prices[s] for s in solvable], assumptions, model, solve_for
+        )
+        rows = []
+        for i, symbol in enumerate(solvable):
+            rows.append({
+                "symbol": symbol,
+                "current_price": prices[symbol],
+                "model": model,
+                "solve_for": solve_for,
+                **{k: v[i].item() for k, v in result.items()},
+            })
+        return rows
+
+    def get_portfolio_valuation(self, holdings, assumptions=None) -> dict:
+        """
+        Value a list of holdings ({symbol, quantity, cost}) in one batch: unique symbols are
+        fetched concurrently, priced with one price board call per 100 symbols and valued
+        with a single vectorized calculate_all_models pass.
+        """
+        from valuation_models import calculate_all_models_vectorized
+
+        from valuation_models import check_projection_years
+
+        if assumptions is not None and not isinstance(assumptions, dict):
+            raise ValueError("'assumptions' must be an object")
+        check_projection_years(assumptions or {})
+
+        def number(holding, i, field, required):
+            value = holding.get(field)
+            if value is None and not required:
+                return np.nan  # cost is optional; null means unknown
+            try:
+                parsed = float(value)
+            except (TypeError, ValueError):
+                parsed = math.nan
+            # Bools are not quantities, and "nan"/"inf" would turn every total into null
+            if isinstance(value, bool) or not math.isfinite(parsed):
+                raise ValueError(f"Holding {i} needs a finite numeric '{field}'")
+            return parsed
+
+        positions = []
+        for i, holding in enumerate(holdings):
+            if not isinstance(holding, dict):
+                raise ValueError(f"Holding {i} must be an object with symbol, quantity and cost")
+            symbol = str(holding.get("symbol") or "").upper().strip()
+            if not symbol:
+                raise ValueError(f"Holding {i} needs a 'symbol'")
+            positions.append({
+                "symbol": symbol,
+                "quantity": number(holding, i, "quantity", required=True),
+                "cost": number(holding, i, "cost", required=False),
+            })
+
+        symbols = sorted({p["symbol"] for p in positions})
+        fundamentals = self.get_fundamentals_batch([s for s in symbols if self.validate_symbol(s)])
+        prices = self.get_price_board(list(fundamentals))
+        valued = [s for s in symbols if s in fundamentals]
+        models = calculate_all_models_vectorized([fundamentals[s] for s in valued], assumptions or {})
+        per_symbol = {s: {m: float(v[i]) for m, v in models.items()} for i, s in enumerate(valued)}
+
+        total_market_value = total_cost = total_pnl = total_intrinsic = total_earnings = pe_market_value = 0.0
+        valued_market_value = 0.0
+        unvalued = 0
+        sector_values = {}
+        for position in positions:
+            symbol = position["symbol"]
+            if symbol not in fundamentals or symbol not in prices:
+                position["error"] = f"No data available for {symbol}"
+                continue
+            data = fundamentals[symbol]
+            price = prices[symbol]
+            intrinsic = per_symbol[symbol]["weighted_average"]
+            quantity = position["quantity"]
+            market_value = quantity * price
+            position.update({
+                "sector": self.get_sector(symbol),
+                "current_price": price,
+                "market_value": market_value,
+                "cost_basis": quantity * position["cost"],
+                "unrealized_pnl": market_value - quantity * position["cost"],
+                "valuation": per_symbol[symbol],
+                "intrinsic_value_per_share": intrinsic,
+                "intrinsic_value": quantity * intrinsic,
+                "upside_pct": (intrinsic / price - 1) * 100 if intrinsic > 0 and price > 0 else np.nan,
+            })
+
+            total_market_value += market_value
+            if pd.notna(position["cost_basis"]):
+                total_cost += position["cost_basis"]
+                total_pnl += position["unrealized_pnl"]
+            # Positions the models could not value (0) would count as worthless; leave them
+            # out of both sides of the margin of safety instead
+            if intrinsic > 0:
+                total_intrinsic += position["intrinsic_value"]
+                valued_market_value += market_value
+            else:
+                unvalued += 1
+            sector_values[position["sector"]] = sector_values.get(position["sector"], 0.0) + market_value
+            # Portfolio P/E = market value / earnings, over holdings with positive EPS
+            eps = data.get("eps_ttm") if pd.notna(data.get("eps_ttm", np.nan)) else data.get("eps", np.nan)
+            if pd.notna(eps) and eps > 0:
+                total_earnings += quantity * eps
+                pe_market_value += market_value
+
+        summary = {
+            "positions": len(positions),
+            "unique_symbols": len(symbols),
+            "total_market_value": total_market_value,
+            "total_cost": total_cost,
+            "total_unrealized_pnl": total_pnl,
+            "total_intrinsic_value": total_intrinsic,
+            "weighted_pe": pe_market_value / total_earnings if total_earnings > 0 else np.nan,
+            "margin_of_safety_pct": (
+                (total_intrinsic - valued_market_value) / total_intrinsic * 100 if total_intrinsic > 0 else np.nan
+            ),
+            "excluded_from_margin_of_safety": unvalued,
+            "sector_exposure": {
+                sector: value / total_market_value * 100 for sector, value in sorted(
+                    sector_values.items(), key=lambda item: item[1], reverse=True)
+            } if total_market_value > 0 else {},
+        }
+        return {"success": True, "summary": summary, "positions": positions}
 
     def validate_symbol(self, symbol: str) -> bool:
         symbols = self._get_all_symbols()  # This will load symbols if needed
@@ -58,14 +443,14 @@ class StockDataProvider:
         
         # First try to get comprehensive data from VCI
         logger.info(f"Attempting to get comprehensive data from VCI for {symbol}")
-        vci_data = self._get_vci_data(symbol)
+        vci_data = self._get_cached_vci_data(symbol)
         if vci_data and vci_data.get('success'):
             # Enrich VCI data with additional info if needed
             vci_data.update({
                 "symbol": symbol,
                 "name": symbol,  # We'll try to get this from company overview if possible
                 "exchange": "HOSE",  # Default
-                "sector": "Unknown",  # Default
+                "sector": self.get_sector(symbol),
                 "data_period": period,
                 "price_change": np.nan  # VCI doesn't provide this directly
             })
@@ -104,6 +489,170 @@ class StockDataProvider:
             logger.error(f"All VCI methods failed for {symbol}: {exc}")
             raise RuntimeError(f"All VCI data sources failed for {symbol}")
 
+    def _get_cached_vci_data(self, symbol: str) -> dict:
+        """VCI ratio summary changes at most daily, so keep it for FUNDAMENTALS_TTL seconds"""
+        if self._shared_access is not None:
+            self._accessed[symbol] = time.time()
+        cached = self._fundamentals_cache.get(symbol)
+        if cached is not None and time.time() - cached[0] < FUNDAMENTALS_TTL:
+            return dict(cached[1])
+
+        # Another worker on this node may already have fetched it. Only the refresher renews
+        # expired rows; the other workers keep serving a row until the refresher has had a
+        # full extra TTL to replace it, so they do not all refetch the market on expiry.
+        if self._shared_fundamentals is not None:
+            row = self._shared_fundamentals.get_row(symbol)
+            max_age = FUNDAMENTALS_TTL if self._shared_fundamentals.is_refresher else 2 * FUNDAMENTALS_TTL
+            if row is not None and time.time() - row["fetched_at"] < max_age:
+                fetched_at = row.pop("fetched_at")
+                vci_data = {**row, "data_source": "VCI", "success": True}
+                self._fundamentals_cache[symbol] = (fetched_at, dict(vci_data))
+                self._update_aggregates(symbol, vci_data, fetched_at)
+                return vci_data
+
+        vci_data = self._get_vci_data(symbol)
+        if vci_data and vci_data.get('success'):
+            self._store_fundamentals(symbol, vci_data)
+        return vci_data
+
+    def _store_fundamentals(self, symbol: str, vci_data: dict) -> None:
+        fetched_at = time.time()
+        self._fundamentals_cache[symbol] = (fetched_at, dict(vci_data))
+        # Keep sector medians/percentiles current without rescanning the market
+        self._update_aggregates(symbol, vci_data, fetched_at)
+        if self._shared_fundamentals is None:
+            return
+        with self._publish_lock:
+            if not self._pending_publish:
+                self._pending_since = fetched_at
+            self._pending_publish[symbol] = {**vci_data, "fetched_at": fetched_at}
+            due = (len(self._pending_publish) >= SHARED_PUBLISH_BATCH
+                   or fetched_at - self._pending_since >= SHARED_REFRESH_INTERVAL)
+        if due:
+            self.flush_shared_publishes()
+
+    def flush_shared_publishes(self) -> None:
+        """
+        Publish fetched rows to the shared table. Every publish rewrites the whole table,
+        so rows are sent in batches rather than one rewrite per fetched symbol.
+        """
+        if self._shared_fundamentals is None:
+            return
+        with self._publish_lock:
+            rows, self._pending_publish = self._pending_publish, {}
+        if not rows:
+            return
+        try:
+            self._shared_fundamentals.publish(rows)
+        except Exception as e:
+            logger.warning(f"Could not publish {len(rows)} symbols to shared cache: {e}")
+
+    def flush_shared_access(self) -> None:
+        """Share which symbols this worker has read since the last flush (one publish)"""
+        if self._shared_access is None:
+            return
+        accessed, self._accessed = self._accessed, {}
+        if not accessed:
+            return
+        rows = {}
+        for symbol, accessed_at in accessed.items():
+            # Another worker may have shared a later read in the meantime
+            current = self._shared_access.get_row(symbol)
+            if current is not None and current["accessed_at"] > accessed_at:
+                continue
+            rows[symbol] = {"accessed_at": accessed_at}
+        if not rows:
+            return
+        try:
+            self._shared_access.publish(rows)
+        except Exception as e:
+            logger.warning(f"Could not publish access times of {len(accessed)} symbols: {e}")
+
+    def refresh_shared_fundamentals(self, max_workers: int = 8) -> int:
+        """
+        Re-fetch shared rows that are within a quarter TTL of expiring (or past it) and were
+        read by some worker within SHARED_HOT_WINDOW, publishing them in batches. Rows nobody
+        has used for that long are dropped instead, so upstream load follows current traffic
+        rather than every symbol ever requested. Only the refresher calls this; returns rows renewed.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        now = time.time()
+        symbols, values = self._shared_fundamentals.to_arrays()
+        fetched_at = values[:, self._shared_fundamentals.fields.index("fetched_at")].tolist()
+        access_symbols, access_values = self._shared_access.to_arrays()
+        accessed_at = dict(zip(access_symbols, access_values[:, 0].tolist()))
+        hot = set(HOT_SYMBOLS)
+
+        due, cold = [], []
+        for symbol, fetched in zip(symbols, fetched_at):
+            accessed = accessed_at.get(symbol, np.nan)
+            in_use = symbol in hot or accessed >= now - SHARED_HOT_WINDOW
+            if in_use:
+                if not fetched >= now - 0.75 * FUNDAMENTALS_TTL:
+                    due.append(symbol)
+            elif not max(np.nan_to_num(accessed), np.nan_to_num(fetched)) >= now - SHARED_HOT_WINDOW:
+                cold.append(symbol)
+
+        if cold:
+            self._shared_fundamentals.remove(cold)
+            self._shared_access.remove(cold)
+            logger.info(f"Dropped {len(cold)} unused symbols from the shared cache")
+        if not due:
+            return 0
+
+        def fetch(symbol):
+            try:
+                return symbol, self._get_vci_data(symbol)
+            except Exception as e:
+                logger.warning(f"Shared cache refresh failed for {symbol}: {e}")
+                return symbol, {}
+
+        renewed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for symbol, vci_data in pool.map(fetch, due):
+                if vci_data and vci_data.get('success'):
+                    self._store_fundamentals(symbol, vci_data)
+                    renewed += 1
+        self.flush_shared_publishes()
+        logger.info(f"Refreshed {renewed}/{len(due)} expiring symbols in the shared cache")
+        return renewed
+
+    def maintain_shared_cache(self) -> None:
+        """Periodic shared-cache upkeep run by every worker after its warm-up"""
+        self.flush_shared_publishes()
+        self.flush_shared_access()
+        # The in-process copy only needs what the shared table could still serve
+        cutoff = time.time() - 2 * FUNDAMENTALS_TTL
+        for symbol, (fetched_at, _) in list(self._fundamentals_cache.items()):
+            if fetched_at < cutoff:
+                self._fundamentals_cache.pop(symbol, None)
+        if self._shared_fundamentals.try_become_refresher():
+            self.refresh_shared_fundamentals()
+
+    def warm_up(self, hot_symbols=()) -> None:
+        """Load the symbol index and pre-fetch fundamentals for frequently requested tickers"""
+        if self._shared_fundamentals is not None and not self._shared_fundamentals.try_become_refresher():
+            # Another worker owns the refresh; wait briefly for its snapshot instead of hitting VCI too
+            for _ in range(30):
+                if self._shared_symbols.symbols():
+                    break
+                time.sleep(1)
+            self._get_all_symbols()
+            self._get_sector_map()
+            self.sync_sector_aggregates()
+            return
+
+        self._get_all_symbols()
+        self._get_sector_map()
+        for symbol in hot_symbols:
+            try:
+                self._get_cached_vci_data(symbol)
+            except Exception as e:
+                logger.warning(f"Warm-up pre-fetch failed for {symbol}: {e}")
+        self.flush_shared_publishes()
+        self.sync_sector_aggregates()
+
     def _get_company_overview(self, stock, symbol: str) -> dict:
         """Get company overview using improved VCI listing methods"""
         try:
@@ -266,6 +815,62 @@ class StockDataProvider:
             "is_quarterly_data": is_quarter
         }
 
+    def get_statement_history(self, symbol: str) -> list:
+        """
+        Point-in-time financial inputs for every reported quarter, oldest first.
+        Each quarter goes through _extract_financial_metrics on its own, so the fields
+        (and the x4 annualisation) match what the live API would have shown then.
+        """
+        stock = self.vnstock.stock(symbol=symbol.upper(), source="VCI")
+        for lang in ("vi", "en"):
+            income = stock.finance.income_statement(period="quarter", lang=lang, dropna=True)
+            balance = stock.finance.balance_sheet(period="quarter", lang=lang, dropna=True)
+            cashfl = stock.finance.cash_flow(period="quarter", lang=lang, dropna=True)
+            if not (income.empty and balance.empty):
+                break
+
+        def by_quarter(df):
+            year_col = next((c for c in ["yearReport", "Năm", "year"] if c in df.columns), None)
+            quarter_col = next((c for c in ["lengthReport", "Kỳ", "quarter"] if c in df.columns), None)
+            if df.empty or year_col is None or quarter_col is None:
+                return {}
+            return {
+                (int(df[year_col].iloc[i]), int(df[quarter_col].iloc[i])): df.iloc[[i]]
+                for i in range(len(df))
+                if pd.notna(df[year_col].iloc[i]) and pd.notna(df[quarter_col].iloc[i])
+            }
+
+        income, balance, cashfl = by_quarter(income), by_quarter(balance), by_quarter(cashfl)
+        empty = pd.DataFrame()
+        history = []
+        for key in sorted(set(income) | set(balance)):
+            if not 1 <= key[1] <= 4:
+                continue  # Annual rows mixed into the quarterly feed
+            metrics = self._extract_financial_metrics(
+                income.get(key, empty), balance.get(key, empty), cashfl.get(key, empty), True
+            )
+            # Shares at the time = owner's capital / 10,000 VND par value
+            shares = np.nan
+            if key in balance:
+                row = balance[key].iloc[0]
+                for f in ["Vốn góp của chủ sở hữu", "Owner's capital", "Paid-in capital", "charterCapital"]:
+                    if f in row and pd.notna(row[f]):
+                        shares = float(row[f]) / 10000
+                        break
+            metrics.update({"year": key[0], "quarter": key[1], "shares_outstanding": shares})
+            history.append(metrics)
+        return history
+
+    def get_price_history(self, symbol: str, start: str, end: str):
+        """Daily closes in VND as a Series indexed by date (VCI quotes history in thousand VND)"""
+        stock = self.vnstock.stock(symbol=symbol.upper(), source="VCI")
+        quotes = stock.quote.history(start=start, end=end, interval="1D")
+        if quotes is None or quotes.empty:
+            return pd.Series(dtype=float)
+        return pd.Series(
+            quotes["close"].astype(float).values * 1000, index=pd.to_datetime(quotes["time"])
+        ).sort_index()
+
     def _get_price_data(self, stock, shares_outstanding, symbol) -> dict:
         """Get price data using improved VCI method with bid_1_price priority"""
         current_price = self._get_market_price_vci(stock, symbol)
@@ -316,6 +921,7 @@ class StockDataProvider:
     def _get_vci_data(self, symbol: str) -> dict:
         """Get comprehensive financial data from VCI source"""
         try:
+            from vnstock.explorer.vci import Company
             company = Company(symbol)
             
             # Get ratio summary which contains most financial metrics
@@ -483,23 +1089,205 @@ class StockDataProvider:
 
 provider = StockDataProvider()
 
+warmup_state = {"ready": not WARMUP_ON_START, "pid": None, "started_at": None, "finished_at": None, "error": None}
+_warmup_lock = threading.Lock()
+
+
+def _run_warmup():
+    warmup_state["started_at"] = datetime.now().isoformat()
+    try:
+        provider.warm_up(HOT_SYMBOLS)
+    except Exception as e:
+        logger.error(f"Background warm-up failed: {e}")
+        warmup_state["error"] = str(e)
+    # A failed warm-up still leaves the server usable, just cold
+    warmup_state["finished_at"] = datetime.now().isoformat()
+    warmup_state["ready"] = True
+    logger.info(f"Warm-up finished in pid {os.getpid()} ({len(HOT_SYMBOLS)} hot symbols)")
+
+    # Background upkeep, so requests never scan the market: sector aggregates pick up new
+    # snapshots and shared rows, and with a shared cache whichever worker holds the refresh
+    # lock renews expiring rows while the rest only flush rows they had to fetch themselves
+    while True:
+        time.sleep(SHARED_REFRESH_INTERVAL)
+        try:
+            provider.sync_sector_aggregates()
+            if provider._shared_fundamentals is not None:
+                provider.maintain_shared_cache()
+        except Exception as e:
+            logger.warning(f"Background maintenance failed: {e}")
+
+
+def ensure_warmup():
+    """
+    Start the warm-up once per worker process, from the first request it serves (usually
+    the load balancer's /ready probe). Starting it at import would run it only in the
+    master under gunicorn --preload, leaving forked workers unready forever.
+    """
+    if not WARMUP_ON_START or warmup_state["pid"] == os.getpid():
+        return
+    with _warmup_lock:
+        if warmup_state["pid"] == os.getpid():
+            return
+        # State inherited from a parent process (fork) does not describe this one
+        warmup_state.update({"ready": False, "pid": os.getpid(), "started_at": None,
+                             "finished_at": None, "error": None})
+        threading.Thread(target=_run_warmup, name="warmup", daemon=True).start()
+
+
+@app.before_request
+def _start_warmup_in_worker():
+    ensure_warmup()
+
+def _assumptions_from_args(args) -> dict:
+    """
+    Valuation assumptions from query parameters, using the backend's decimal keys.
+    Raises ValueError for values the client got wrong (not numeric, horizon too long).
+    """
+    from valuation_models import DEFAULT_ASSUMPTIONS, check_projection_years
+    assumptions = {}
+    for key, default in DEFAULT_ASSUMPTIONS.items():
+        if key in args and not isinstance(default, dict):
+            try:
+                value = type(default)(args.get(key))
+            except ValueError:
+                raise ValueError(f"{key} must be {'a whole number' if isinstance(default, int) else 'a number'}")
+            if not math.isfinite(value):
+                raise ValueError(f"{key} must be finite")
+            assumptions[key] = value
+    check_projection_years(assumptions)
+    return assumptions
+
+
+def _implied_args(args):
+    """(assumptions, model, solve_for) of an /api/implied request; ValueError on client mistakes"""
+    from valuation_models import MODELS, SOLVE_FOR
+    model = args.get("model", "dcf")
+    if model not in MODELS:
+        raise ValueError(f"Unsupported model {model}; use one of {', '.join(MODELS)}")
+    solve_for = args.get("solve_for", "revenue_growth")
+    if solve_for not in SOLVE_FOR:
+        raise ValueError(f"Unsupported solve_for {solve_for}; use one of {', '.join(SOLVE_FOR)}")
+    return _assumptions_from_args(args), model, solve_for
+
+_snapshot_store = None
+
+def get_snapshot_store():
+    """SnapshotStore over SNAPSHOT_DIR, created on first use (it needs pandas/pyarrow)"""
+    global _snapshot_store
+    if _snapshot_store is None:
+        from snapshots import SnapshotStore
+        _snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+    return _snapshot_store
+
+def _snapshot_version(store):
+    """
+    (version, error) for the request: ?version= only if it is a version on disk, since it
+    becomes part of a file path, otherwise the latest. version is None when there is none.
+    """
+    requested = request.args.get("version")
+    if requested:
+        if requested not in store.versions():
+            return None, f"Unknown snapshot version {requested}"
+        return requested, None
+    return store.latest_version(), "No snapshot available yet"
+
+
+def convert_nan_to_none(obj):
+    """Convert NaN values to None for JSON serialization"""
+    if isinstance(obj, dict):
+        return {k: convert_nan_to_none(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_nan_to_none(v) for v in obj]
+    elif pd.isna(obj):
+        return None
+    else:
+        return obj
+
+def add_derived_metrics(data: dict) -> dict:
+    """Fill per-share, profitability and leverage metrics the frontend expects (in place)"""
+    # Get key values
+    shp = data.get("shares_outstanding", np.nan)
+    total_assets = data.get("total_assets", np.nan)
+    total_liabilities = data.get("total_debt", np.nan)  # VCI uses total_debt
+    net_income = data.get("net_income_ttm", np.nan)
+    current_price = data.get("current_price", np.nan)
+    
+    # Calculate equity
+    equity = (
+        total_assets - total_liabilities
+        if pd.notna(total_assets) and pd.notna(total_liabilities)
+        else np.nan
+    )
+    
+    # Calculate missing per-share metrics if not already provided by VCI
+    if pd.isna(data.get("earnings_per_share", np.nan)):
+        data["earnings_per_share"] = (
+            net_income / shp
+            if pd.notna(net_income) and pd.notna(shp) and shp > 0
+            else data.get("eps", np.nan)  # Use VCI EPS if available
+        )
+    else:
+        data["earnings_per_share"] = data.get("eps", np.nan)
+        
+    if pd.isna(data.get("book_value_per_share", np.nan)):
+        data["book_value_per_share"] = (
+            equity / shp
+            if pd.notna(equity) and pd.notna(shp) and shp > 0
+            else data.get("bvps", np.nan)  # Use VCI BVPS if available
+        )
+    else:
+        data["book_value_per_share"] = data.get("bvps", np.nan)
+    
+    # Set dividend per share from VCI data
+    data["dividend_per_share"] = data.get("dividend_per_share", np.nan)
+    
+    # ROE and ROA - use VCI values if available, otherwise calculate
+    if pd.isna(data.get("roe", np.nan)):
+        data["roe"] = (
+            (net_income / equity) * 100
+            if pd.notna(net_income) and pd.notna(equity) and equity != 0
+            else np.nan
+        )
+        
+    if pd.isna(data.get("roa", np.nan)):
+        data["roa"] = (
+            (net_income / total_assets) * 100
+            if pd.notna(net_income) and pd.notna(total_assets) and total_assets != 0
+            else np.nan
+        )
+    
+    # Debt to equity ratio
+    if pd.isna(data.get("debt_to_equity", np.nan)):
+        data["debt_to_equity"] = (
+            total_liabilities / equity
+            if pd.notna(total_liabilities) and pd.notna(equity) and equity != 0
+            else np.nan
+        )
+    
+    # PE and PB ratios - use VCI values if available, otherwise calculate
+    if pd.isna(data.get("pe_ratio", np.nan)) and pd.notna(data.get("earnings_per_share")) and data["earnings_per_share"] > 0:
+        data["pe_ratio"] = current_price / data["earnings_per_share"]
+        
+    if pd.isna(data.get("pb_ratio", np.nan)) and pd.notna(data.get("book_value_per_share")) and data["book_value_per_share"] > 0:
+        data["pb_ratio"] = current_price / data["book_value_per_share"]
+    
+    # Add data quality indicators
+    data["data_quality"] = {
+        "has_real_price": pd.notna(current_price),
+        "has_financials": pd.notna(net_income),
+        "pe_reliable": pd.notna(data.get("pe_ratio")),
+        "pb_reliable": pd.notna(data.get("pb_ratio")),
+        "vci_data": data.get("data_source") == "VCI"
+    }
+    return data
+
 @app.route("/api/stock/<symbol>")
 def api_stock(symbol):
     try:
         period = request.args.get("period", "annual")
         data = provider.get_stock_data(symbol, period)
         
-        # Convert NaN values to None for JSON serialization
-        def convert_nan_to_none(obj):
-            if isinstance(obj, dict):
-                return {k: convert_nan_to_none(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_nan_to_none(v) for v in obj]
-            elif pd.isna(obj):
-                return None
-            else:
-                return obj
-        
         clean_data = convert_nan_to_none(data)
         return jsonify(clean_data)
     except Exception as exc:
@@ -512,102 +1300,196 @@ def api_app(symbol):
         period = request.args.get("period", "annual")
         data = provider.get_stock_data(symbol, period)
         if data.get("success"):
-            # Get key values
-            shp = data.get("shares_outstanding", np.nan)
-            total_assets = data.get("total_assets", np.nan)
-            total_liabilities = data.get("total_debt", np.nan)  # VCI uses total_debt
-            net_income = data.get("net_income_ttm", np.nan)
-            current_price = data.get("current_price", np.nan)
-            
-            # Calculate equity
-            equity = (
-                total_assets - total_liabilities
-                if pd.notna(total_assets) and pd.notna(total_liabilities)
-                else np.nan
-            )
-            
-            # Calculate missing per-share metrics if not already provided by VCI
-            if pd.isna(data.get("earnings_per_share", np.nan)):
-                data["earnings_per_share"] = (
-                    net_income / shp
-                    if pd.notna(net_income) and pd.notna(shp) and shp > 0
-                    else data.get("eps", np.nan)  # Use VCI EPS if available
-                )
-            else:
-                data["earnings_per_share"] = data.get("eps", np.nan)
-                
-            if pd.isna(data.get("book_value_per_share", np.nan)):
-                data["book_value_per_share"] = (
-                    equity / shp
-                    if pd.notna(equity) and pd.notna(shp) and shp > 0
-                    else data.get("bvps", np.nan)  # Use VCI BVPS if available
-                )
-            else:
-                data["book_value_per_share"] = data.get("bvps", np.nan)
-            
-            # Set dividend per share from VCI data
-            data["dividend_per_share"] = data.get("dividend_per_share", np.nan)
-            
-            # ROE and ROA - use VCI values if available, otherwise calculate
-            if pd.isna(data.get("roe", np.nan)):
-                data["roe"] = (
-                    (net_income / equity) * 100
-                    if pd.notna(net_income) and pd.notna(equity) and equity != 0
-                    else np.nan
-                )
-                
-            if pd.isna(data.get("roa", np.nan)):
-                data["roa"] = (
-                    (net_income / total_assets) * 100
-                    if pd.notna(net_income) and pd.notna(total_assets) and total_assets != 0
-                    else np.nan
-                )
-            
-            # Debt to equity ratio
-            if pd.isna(data.get("debt_to_equity", np.nan)):
-                data["debt_to_equity"] = (
-                    total_liabilities / equity
-                    if pd.notna(total_liabilities) and pd.notna(equity) and equity != 0
-                    else np.nan
-                )
-            
-            # PE and PB ratios - use VCI values if available, otherwise calculate
-            if pd.isna(data.get("pe_ratio", np.nan)) and pd.notna(data.get("earnings_per_share")) and data["earnings_per_share"] > 0:
-                data["pe_ratio"] = current_price / data["earnings_per_share"]
-                
-            if pd.isna(data.get("pb_ratio", np.nan)) and pd.notna(data.get("book_value_per_share")) and data["book_value_per_share"] > 0:
-                data["pb_ratio"] = current_price / data["book_value_per_share"]
-            
-            # Add data quality indicators
-            data["data_quality"] = {
-                "has_real_price": pd.notna(current_price),
-                "has_financials": pd.notna(net_income),
-                "pe_reliable": pd.notna(data.get("pe_ratio")),
-                "pb_reliable": pd.notna(data.get("pb_ratio")),
-                "vci_data": data.get("data_source") == "VCI"
-            }
-            
-        # Convert NaN values to None for JSON serialization
-        def convert_nan_to_none(obj):
-            if isinstance(obj, dict):
-                return {k: convert_nan_to_none(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_nan_to_none(v) for v in obj]
-            elif pd.isna(obj):
-                return None
-            else:
-                return obj
-        
+            add_derived_metrics(data)
+
         clean_data = convert_nan_to_none(data)
         return jsonify(clean_data)
     except Exception as exc:
         logger.error(f"API /app-data error {symbol}: {exc}")
         return jsonify({"success": False, "error": str(exc)}), 500
 
+@app.route("/api/relative/<symbol>")
+def api_relative(symbol):
+    try:
+        return jsonify(provider.get_relative_valuation(symbol))
+    except Exception as exc:
+        logger.error(f"API /relative error {symbol}: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
+@app.route("/api/implied/<symbol>")
+def api_implied(symbol):
+    try:
+        assumptions, model, solve_for = _implied_args(request.args)
+        if not provider.validate_symbol(symbol):
+            raise ValueError(f"Symbol {symbol.upper()} is not valid.")
+    except ValueError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
+    try:
+        rows = provider.get_implied_parameters([symbol], assumptions, model, solve_for)
+        if not rows:
+            raise RuntimeError(f"No fundamentals or price available for {symbol.upper()}")
+        return jsonify({**convert_nan_to_none(rows[0]), "success": True})
+    except Exception as exc:
+        logger.error(f"API /implied error {symbol}: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
+@app.route("/api/implied")
+def api_implied_universe():
+    try:
+        assumptions, model, solve_for = _implied_args(request.args)
+    except ValueError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
+    try:
+        # Without an explicit list, solve over every symbol already cached (no market-wide fetch on request)
+        symbols = [s.strip().upper() for s in request.args.get("symbols", "").split(",") if s.strip()]
+        if len(symbols) > MAX_IMPLIED_SYMBOLS:
+            return jsonify({"success": False,
+                            "error": f"At most {MAX_IMPLIED_SYMBOLS} symbols per request"}), 400
+        invalid = [s for s in symbols if not provider.validate_symbol(s)]
+        if invalid:
+            return jsonify({"success": False, "error": f"Invalid symbols: {', '.join(invalid)}"}), 400
+        rows = provider.get_implied_parameters(
+            symbols or provider.cached_symbols(), assumptions, model, solve_for, fetch_missing=bool(symbols)
+        )
+        return jsonify({"success": True, "count": len(rows), "results": convert_nan_to_none(rows)})
+    except Exception as exc:
+        logger.error(f"API /implied error: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
+@app.route("/api/snapshot")
+def api_snapshot():
+    try:
+        store = get_snapshot_store()
+        version, error = _snapshot_version(store)
+        if version is None:
+            return jsonify({"success": False, "error": error}), 404
+        frame = store.load(version)
+
+        symbols = [s.strip().upper() for s in request.args.get("symbols", "").split(",") if s.strip()]
+        if symbols:
+            frame = frame[frame.index.isin(symbols)]
+        sector = request.args.get("sector")
+        if sector:
+            frame = frame[frame["sector"] == sector]
+        sort = request.args.get("sort")
+        if sort in frame.columns:
+            frame = frame.sort_values(sort, ascending=request.args.get("order", "desc") == "asc")
+        limit = request.args.get("limit", type=int)
+        if limit:
+            frame = frame.head(limit)
+
+        rows = frame.reset_index().to_dict(orient="records")
+        return jsonify({"success": True, "version": version, "count": len(rows), "results": convert_nan_to_none(rows)})
+    except Exception as exc:
+        logger.error(f"API /snapshot error: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
+@app.route("/api/snapshot/diff")
+def api_snapshot_diff():
+    try:
+        store = get_snapshot_store()
+        version, error = _snapshot_version(store)
+        if version is None:
+            return jsonify({"success": False, "error": error}), 404
+        metric = request.args.get("metric", "weighted_average")
+        frame = store.load(version)
+        if metric not in frame.columns or frame[metric].dtype.kind not in "fiu":
+            return jsonify({"success": False, "error": f"Unknown or non-numeric metric {metric}"}), 400
+        previous, changes = store.diff(version, metric)
+        changes = changes.head(request.args.get("limit", 20, type=int))
+        rows = changes.reset_index().rename(columns={"index": "symbol"}).to_dict(orient="records")
+        return jsonify({
+            "success": True, "version": version, "previous_version": previous,
+            "metric": metric, "results": convert_nan_to_none(rows)
+        })
+    except Exception as exc:
+        logger.error(f"API /snapshot/diff error: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
+@app.route("/api/portfolio", methods=["POST"])
+def api_portfolio():
+    payload = request.get_json(silent=True) or {}
+    holdings = payload.get("holdings")
+    if not isinstance(holdings, list) or not holdings:
+        return jsonify({"success": False, "error": "Body must contain a non-empty 'holdings' list"}), 400
+    try:
+        result = provider.get_portfolio_valuation(holdings, payload.get("assumptions"))
+        return jsonify(convert_nan_to_none(result))
+    except ValueError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
+    except Exception as exc:
+        logger.error(f"API /portfolio error: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
+# Columns add_derived_metrics adds on top of the snapshot
+EXPORT_DERIVED_COLUMNS = ["earnings_per_share", "book_value_per_share", "data_period"]
+
+@app.route("/api/export")
+def api_export():
+    """
+    Stream the latest snapshot (provider fields, derived metrics and model values) for the
+    whole market or a filtered subset. Rows come from the in-memory snapshot chunk by chunk,
+    so no upstream calls are made and memory stays flat regardless of the universe size.
+    """
+    from exporters import EXPORT_FORMATS, STREAMERS, iter_row_chunks
+    try:
+        fmt = request.args.get("format", "csv").lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"success": False, "error": f"Unsupported format {fmt}"}), 400
+        period = request.args.get("period", "annual")
+        if period not in ("annual", "quarterly"):
+            return jsonify({"success": False, "error": f"Unsupported period {period}"}), 400
+
+        store = get_snapshot_store()
+        version, error = _snapshot_version(store)
+        if version is None:
+            return jsonify({"success": False, "error": error}), 404
+        frame = store.load(version)
+
+        symbols = [s.strip().upper() for s in request.args.get("symbols", "").split(",") if s.strip()]
+        if symbols:
+            frame = frame[frame.index.isin(symbols)]
+        sector = request.args.get("sector")
+        if sector:
+            frame = frame[frame["sector"] == sector]
+
+        available = ["symbol"] + list(frame.columns) + EXPORT_DERIVED_COLUMNS
+        requested = [c.strip() for c in request.args.get("columns", "").split(",") if c.strip()]
+        unknown = [c for c in requested if c not in available]
+        if unknown:
+            return jsonify({"success": False, "error": f"Unknown columns: {', '.join(unknown)}"}), 400
+        columns = requested or available
+        numeric = [c for c in columns if c in frame.columns and frame[c].dtype.kind in "fiu"]
+        numeric += [c for c in EXPORT_DERIVED_COLUMNS[:2] if c in columns]
+
+        def transform(row):
+            row = add_derived_metrics(row)
+            row["data_period"] = period
+            return row
+
+        chunks = iter_row_chunks(frame, transform)
+        body = STREAMERS[fmt](chunks, columns, numeric)
+        filename = f"valuations_{version}_{period}.{fmt}"
+        return Response(
+            stream_with_context(body),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename={filename}", "X-Snapshot-Version": version},
+        )
+    except Exception as exc:
+        logger.error(f"API /export error: {exc}")
+        return jsonify({"success": False, "error": str(exc)}), 500
+
 @app.route("/health")
 def health():
     return jsonify({"status": "healthy", "vnstock_available": True})
 
+@app.route("/ready")
+def ready():
+    # Load balancers should route traffic only once this returns 200
+    if not warmup_state["ready"]:
+        return jsonify({"status": "warming_up", **warmup_state}), 503
+    return jsonify({"status": "ready", **warmup_state})
+
 if __name__ == "__main__":
     print("Vietnamese Stock Valuation Backend – running on http://0.0.0.0:5000")
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
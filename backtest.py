@@ -0,0 +1,193 @@
+# backtest.py
+"""
+Historical backtest of the valuation models.
+
+For every symbol and past quarter the inputs are rebuilt from that quarter's statements,
+valued with the same vectorized models the API uses, and compared with the price return
+that followed. Building inputs is the slow, upstream-bound part: it runs in a process pool
+and is cached per symbol on disk, so re-running with other assumptions only redoes the
+(vectorized) valuation step.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from valuation_models import calculate_all_models_vectorized
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_CACHE_DIR = os.environ.get("BACKTEST_CACHE_DIR", "backtest_cache")
+DEFAULT_HORIZONS = (63, 126, 252)  # trading days, about 3, 6 and 12 months
+REPORT_LAG_DAYS = 45  # Quarterly statements are published up to 45 days after quarter end
+
+
+def _quarter_end(year, quarter):
+    return pd.Timestamp(year=year, month=3 * quarter, day=1) + pd.offsets.MonthEnd(0)
+
+
+def _cache_path(cache_dir, symbol):
+    return os.path.join(cache_dir, f"{symbol}.json")
+
+
+def _write_cache(path, result):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(path + ".tmp", path)
+
+
+def _extend_prices(symbol, cached, path):
+    """
+    Append closes published since the cached prices ended, so forward returns of recent
+    quarters fill in on later runs without rebuilding the statements
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    prices = cached["prices"]
+    end = cached.get("prices_end") or prices["dates"][-1]
+    if end >= today:
+        return cached
+
+    os.environ.setdefault("WARMUP_ON_START", "0")
+    from backend_server import provider
+
+    start = (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    try:
+        newer = provider.get_price_history(symbol, start, today)
+    except Exception as e:
+        logger.warning(f"Could not extend cached prices for {symbol}: {e}")
+        return cached
+    last = prices["dates"][-1]
+    for date, close in newer.items():
+        date = date.strftime("%Y-%m-%d")
+        if date > last:
+            prices["dates"].append(date)
+            prices["close"].append(float(close))
+    cached["prices_end"] = today
+    _write_cache(path, cached)
+    return cached
+
+
+def build_symbol_inputs(symbol, cache_dir=BACKTEST_CACHE_DIR, refresh=False):
+    """
+    Point-in-time inputs and daily prices for one symbol, read from the on-disk cache
+    when present (with the price history extended to today). Runs in worker processes,
+    so it imports the provider itself.
+    """
+    path = _cache_path(cache_dir, symbol)
+    if not refresh and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("inputs") and cached.get("prices", {}).get("dates"):
+            return _extend_prices(symbol, cached, path)
+
+    os.environ.setdefault("WARMUP_ON_START", "0")
+    from backend_server import provider
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    history = provider.get_statement_history(symbol)
+    result = {"symbol": symbol, "built_at": datetime.now().isoformat(), "inputs": history, "prices": {}}
+    if history:
+        start = _quarter_end(history[0]["year"], history[0]["quarter"]).strftime("%Y-%m-%d")
+        prices = provider.get_price_history(symbol, start, today)
+        result["prices"] = {
+            "dates": [d.strftime("%Y-%m-%d") for d in prices.index],
+            "close": prices.tolist(),
+        }
+        result["prices_end"] = today
+
+    # Empty statements or prices are as likely to be upstream throttling as a real gap,
+    # so they are not cached and the next run asks again
+    if history and result["prices"]["dates"]:
+        _write_cache(path, result)
+    return result
+
+
+def _build_safely(args):
+    symbol, cache_dir, refresh = args
+    try:
+        return build_symbol_inputs(symbol, cache_dir, refresh)
+    except Exception as e:
+        logger.warning(f"Backtest inputs failed for {symbol}: {e}")
+        return {"symbol": symbol, "inputs": [], "prices": {}}
+
+
+def load_inputs(symbols, cache_dir=BACKTEST_CACHE_DIR, processes=4, refresh=False):
+    """Build (or load from cache) inputs for all symbols across a process pool"""
+    jobs = [(s.upper(), cache_dir, refresh) for s in symbols]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_build_safely, jobs))
+
+
+def value_observations(symbol_inputs, assumptions=None, horizons=DEFAULT_HORIZONS, report_lag_days=REPORT_LAG_DAYS):
+    """
+    One row per (symbol, quarter): fair values from a single vectorized valuation of every
+    point-in-time input, the price when the statements became public, and forward returns.
+    """
+    rows, stock_data = [], []
+    for item in symbol_inputs:
+        prices = item.get("prices") or {}
+        if not item.get("inputs") or not prices.get("dates"):
+            continue
+        dates = pd.to_datetime(prices["dates"]).values
+        close = np.asarray(prices["close"], dtype=float)
+        for inputs in item["inputs"]:
+            available = _quarter_end(inputs["year"], inputs["quarter"]) + pd.Timedelta(days=report_lag_days)
+            entry = int(np.searchsorted(dates, available.to_datetime64()))
+            if entry >= len(close):
+                continue  # Not yet public, or no price since
+            row = {
+                "symbol": item["symbol"],
+                "year": inputs["year"],
+                "quarter": inputs["quarter"],
+                "as_of": str(dates[entry])[:10],
+                "price": close[entry],
+            }
+            for h in horizons:
+                row[f"return_{h}d"] = close[entry + h] / close[entry] - 1 if entry + h < len(close) else np.nan
+            rows.append(row)
+            stock_data.append(inputs)
+
+    if not rows:
+        return pd.DataFrame()
+
+    frame = pd.DataFrame(rows)
+    for model, values in calculate_all_models_vectorized(stock_data, assumptions or {}).items():
+        frame[model] = values
+    price = frame["price"]
+    fair = frame["weighted_average"]
+    frame["upside"] = np.where((fair > 0) & (price > 0), fair / price - 1, np.nan)
+    return frame
+
+
+def summarize(frame, horizons=DEFAULT_HORIZONS):
+    """Per horizon: rank correlation of upside vs forward return, hit rate and quintile returns"""
+    summary = {}
+    for h in horizons:
+        column = f"return_{h}d"
+        sample = frame[["upside", column]].dropna() if not frame.empty else pd.DataFrame()
+        if len(sample) < 2:
+            summary[column] = {"observations": len(sample)}
+            continue
+        quintiles = pd.qcut(sample["upside"].rank(method="first"), 5, labels=False, duplicates="drop") \
+            if len(sample) >= 5 else pd.Series(0, index=sample.index)
+        summary[column] = {
+            "observations": len(sample),
+            # Spearman as Pearson on ranks; pandas' method="spearman" would need scipy
+            "rank_correlation": sample["upside"].rank().corr(sample[column].rank()),
+            "hit_rate": float((np.sign(sample["upside"]) == np.sign(sample[column])).mean()),
+            "mean_return_by_upside_quintile": sample.groupby(quintiles)[column].mean().tolist(),
+        }
+    return summary
+
+
+def run_backtest(symbols, assumptions=None, cache_dir=BACKTEST_CACHE_DIR, processes=4,
+                 horizons=DEFAULT_HORIZONS, refresh=False):
+    symbol_inputs = load_inputs(symbols, cache_dir, processes, refresh)
+    frame = value_observations(symbol_inputs, assumptions, horizons)
+    logger.info(f"Backtest: {len(frame)} observations over {len(symbols)} symbols")
+    return frame, summarize(frame, horizons)
@@ -0,0 +1,159 @@
+# batch_jobs.py
+"""
+Batch jobs meant to run from cron after market close, e.g.
+
+    python batch_jobs.py implied-growth --output implied_growth.json
+    python batch_jobs.py snapshot --workers 8
+    python batch_jobs.py backtest --symbols VCB,FPT --output backtest
+"""
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# A batch run has no traffic to warm up for
+os.environ.setdefault("WARMUP_ON_START", "0")
+
+from backend_server import SNAPSHOT_DIR, VCI_NUMERIC_FIELDS, convert_nan_to_none, provider
+from snapshots import SnapshotStore
+from valuation_models import calculate_all_models_vectorized
+
+logger = logging.getLogger(__name__)
+
+
+def run_implied_growth(output_path, model="dcf", solve_for="revenue_growth", assumptions=None, symbols=None):
+    """Solve the market-implied parameter for the whole universe and write it as JSON"""
+    symbols = symbols or list(provider._get_all_symbols())
+    logger.info(f"Implied {solve_for} ({model}) for {len(symbols)} symbols")
+    rows = provider.get_implied_parameters(symbols, assumptions, model, solve_for)
+
+    converged = sum(1 for r in rows if r["converged"])
+    result = {
+        "generated_at": datetime.now().isoformat(),
+        "model": model,
+        "solve_for": solve_for,
+        "assumptions": assumptions or {},
+        "count": len(rows),
+        "converged": converged,
+        "results": convert_nan_to_none(rows),
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    logger.info(f"Wrote {len(rows)} rows ({converged} converged) to {output_path}")
+    return result
+
+
+def run_valuation_snapshot(snapshot_dir=None, version=None, assumptions=None, symbols=None, max_workers=8):
+    """
+    Fetch fundamentals and prices for the market, value every symbol and write a
+    versioned Parquet snapshot. Each fetched symbol is checkpointed as soon as it
+    arrives, so re-running the same version after a crash only fetches what is missing.
+    """
+    store = SnapshotStore(snapshot_dir or SNAPSHOT_DIR)
+    version = version or datetime.now().strftime("%Y%m%d")
+    symbols = symbols or list(provider._get_all_symbols())
+
+    fundamentals = store.load_checkpoint(version)
+    pending = [s for s in symbols if s not in fundamentals]
+    logger.info(f"Snapshot {version}: {len(fundamentals)} symbols from checkpoint, {len(pending)} to fetch")
+
+    def fetch(symbol):
+        try:
+            return symbol, provider._get_cached_vci_data(symbol)
+        except Exception as e:
+            logger.warning(f"Snapshot fetch failed for {symbol}: {e}")
+            return symbol, {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch, symbol) for symbol in pending]
+        for future in as_completed(futures):
+            symbol, data = future.result()
+            # Failed symbols are not checkpointed so a re-run retries them
+            if data and data.get('success'):
+                store.append_checkpoint(version, symbol, data)
+                fundamentals[symbol] = data
+    provider.flush_shared_publishes()
+
+    # Price board chunks that failed are just missing from the result, so a re-run
+    # fetches whatever the saved board lacks instead of trusting it as complete
+    prices = store.load_prices(version) or {}
+    unpriced = sorted(s for s in fundamentals if s not in prices)
+    if unpriced:
+        prices.update(provider.get_price_board(unpriced))
+        store.save_prices(version, prices)
+        missing = sum(1 for s in unpriced if s not in prices)
+        if missing:
+            logger.warning(f"Snapshot {version}: no price for {missing} symbols; re-run to retry them")
+
+    wanted = set(symbols)
+    ordered = sorted(s for s in fundamentals if s in wanted)
+    stock_data = [{**fundamentals[s], "current_price": prices.get(s, np.nan)} for s in ordered]
+    values = calculate_all_models_vectorized(stock_data, assumptions or {})
+
+    frame = pd.DataFrame([{f: d.get(f, np.nan) for f in VCI_NUMERIC_FIELDS} for d in stock_data])
+    frame.insert(0, "symbol", ordered)
+    frame.insert(1, "sector", [provider.get_sector(s) for s in ordered])
+    frame.insert(2, "current_price", [d["current_price"] for d in stock_data])
+    for model, model_values in values.items():
+        frame[model] = model_values
+    price = frame["current_price"]
+    frame["upside_pct"] = np.where(price > 0, (frame["weighted_average"] / price - 1) * 100, np.nan)
+
+    store.write(version, frame)
+    logger.info(f"Wrote snapshot {version} with {len(frame)} symbols")
+    return version, frame
+
+
+def run_backtest_job(output_prefix, symbols=None, assumptions=None, processes=4, refresh=False):
+    """Backtest the models and write observations (Parquet) and a summary (JSON)"""
+    from backtest import run_backtest
+
+    symbols = symbols or list(provider._get_all_symbols())
+    frame, summary = run_backtest(symbols, assumptions, processes=processes, refresh=refresh)
+    frame.to_parquet(f"{output_prefix}_observations.parquet", index=False)
+    with open(f"{output_prefix}_summary.json", "w", encoding="utf-8") as f:
+        json.dump(convert_nan_to_none({"assumptions": assumptions or {}, **summary}), f, indent=2)
+    logger.info(f"Wrote backtest results to {output_prefix}_*")
+    return frame, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nightly valuation batch jobs")
+    sub = parser.add_subparsers(dest="job", required=True)
+
+    implied = sub.add_parser("implied-growth", help="Reverse DCF across the market")
+    implied.add_argument("--output", default="implied_growth.json")
+    implied.add_argument("--model", choices=["dcf", "fcfe", "ddm"], default="dcf")
+    implied.add_argument("--solve-for", choices=["revenue_growth", "discount_rate"], default="revenue_growth")
+    implied.add_argument("--symbols", default="", help="Comma separated subset (default: all listed symbols)")
+
+    snapshot = sub.add_parser("snapshot", help="Full-market valuation snapshot (resumable)")
+    snapshot.add_argument("--snapshot-dir", default=None, help="Defaults to SNAPSHOT_DIR")
+    snapshot.add_argument("--version", default=None, help="Snapshot version, defaults to today (YYYYMMDD)")
+    snapshot.add_argument("--workers", type=int, default=8, help="Concurrent upstream fetches")
+    snapshot.add_argument("--symbols", default="", help="Comma separated subset (default: all listed symbols)")
+
+    backtest = sub.add_parser("backtest", help="Historical backtest of model fair values")
+    backtest.add_argument("--output", default="backtest", help="Prefix for the output files")
+    backtest.add_argument("--symbols", default="", help="Comma separated subset (default: all listed symbols)")
+    backtest.add_argument("--processes", type=int, default=4)
+    backtest.add_argument("--assumptions", default="{}", help="JSON assumptions, e.g. '{\"wacc\": 0.11}'")
+    backtest.add_argument("--refresh", action="store_true", help="Rebuild cached point-in-time inputs")
+
+    args = parser.parse_args(argv)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    if args.job == "implied-growth":
+        run_implied_growth(args.output, args.model, args.solve_for, symbols=symbols or None)
+    elif args.job == "snapshot":
+        run_valuation_snapshot(args.snapshot_dir, args.version, symbols=symbols or None, max_workers=args.workers)
+    elif args.job == "backtest":
+        run_backtest_job(args.output, symbols or None, json.loads(args.assumptions), args.processes, args.refresh)
+
+
+if __name__ == "__main__":
+    main()
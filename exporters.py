@@ -0,0 +1,104 @@
+# exporters.py
+import csv
+import io
+import json
+import math
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def iter_row_chunks(frame, transform=None, chunk_size=500):
+    """
+    Yield lists of row dicts from a symbol-indexed DataFrame, chunk_size rows at a time.
+    transform (row dict -> row dict) is applied per row, so only one chunk is ever materialised.
+    """
+    for start in range(0, len(frame), chunk_size):
+        rows = frame.iloc[start:start + chunk_size].reset_index().to_dict(orient="records")
+        yield [transform(row) for row in rows] if transform else rows
+
+
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):  # numpy scalar
+        return _clean(value.item())
+    return value
+
+
+def stream_csv(chunks, columns, numeric_columns=()):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows({c: _clean(row.get(c)) for c in columns} for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    remaining = buffer.getvalue()
+    if remaining:
+        yield remaining
+
+
+def stream_ndjson(chunks, columns, numeric_columns=()):
+    for rows in chunks:
+        yield "".join(
+            json.dumps({c: _clean(row.get(c)) for c in columns}, ensure_ascii=False) + "\n" for row in rows
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every Parquet row group"""
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_parquet(chunks, columns, numeric_columns=()):
+    """
+    One Parquet row group per chunk, flushed to the client as soon as it is written.
+    The schema is fixed up front (numeric_columns as float64, the rest as strings)
+    so an all-null first chunk cannot pin a column to the wrong type.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    numeric_columns = set(numeric_columns)
+    schema = pa.schema([(c, pa.float64() if c in numeric_columns else pa.string()) for c in columns])
+
+    def convert(column, value):
+        value = _clean(value)
+        if value is None or column in numeric_columns:
+            return value
+        return str(value)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        table = pa.Table.from_pylist([{c: convert(c, row.get(c)) for c in columns} for row in rows], schema=schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}
@@ -0,0 +1,371 @@
+# load_replay.py
+"""
+Replay recorded access logs against the backend to size capacity and check caching changes.
+
+    python load_replay.py access.log --speed 5
+    python load_replay.py access.log --target http://staging:5000 --speed 1
+
+Only /api/stock, /api/app-data and /health requests are replayed, with their original
+relative timing divided by --speed. Latency is measured from each request's scheduled send
+time, so a client that falls behind shows up as latency (and as client backlog in the
+report) instead of being hidden. Replay starts once the target answers /ready.
+
+Without --target the server runs in-process against a stubbed VCI backend (no network),
+sharing the GIL with the client threads. For numbers closer to production, run the stub
+behind gunicorn and point --target at it:
+
+    STUB_SYMBOLS=VCB,FPT,VNM gunicorn -w 4 -b 127.0.0.1:5001 'load_replay:stub_app()'
+    python load_replay.py access.log --target http://127.0.0.1:5001
+
+Either way the stub counts upstream calls (across workers, via STUB_CALLS_FILE) and the
+report includes upstream calls per request, excluding those made before the replay.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import sys
+import threading
+import time
+import types
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+STUB_CALLS_PATH = "/_stub/calls"
+REPLAYED_PATHS = re.compile(r"^/(api/stock/|api/app-data/|health\b)")
+# Common/combined log format (gunicorn, nginx) and werkzeug's dev-server variant
+LOG_LINE = re.compile(r'\[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" (?P<status>\d{3})')
+TIME_FORMATS = ["%d/%b/%Y:%H:%M:%S %z", "%d/%b/%Y %H:%M:%S"]
+
+
+def parse_log(lines):
+    """Return [(seconds since first request, path)] for replayable GET requests"""
+    entries = []
+    for line in lines:
+        match = LOG_LINE.search(line)
+        if not match or match.group("method") != "GET" or not REPLAYED_PATHS.match(match.group("path")):
+            continue
+        raw = match.group("time")
+        for fmt in TIME_FORMATS:
+            try:
+                stamp = datetime.strptime(raw, fmt).timestamp()
+                break
+            except ValueError:
+                continue
+        else:
+            continue
+        entries.append((stamp, match.group("path")))
+    entries.sort()
+    if not entries:
+        return []
+    start = entries[0][0]
+    return [(stamp - start, path) for stamp, path in entries]
+
+
+def symbols_in(entries):
+    symbols = set()
+    for _, path in entries:
+        parts = path.split("?")[0].strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "api":
+            symbols.add(parts[2].upper())
+    return sorted(symbols)
+
+
+# --- stubbed VCI backend ------------------------------------------------------
+
+class StubVCI:
+    """
+    Just enough of the vnstock API for the backend, with fixed latency per call and a call
+    counter. Values are derived from the symbol so responses are stable across runs.
+    With calls_path every call also appends one byte to that file, so stubs in several
+    server processes share one count (the file size).
+    """
+    def __init__(self, symbols, latency=0.0, calls_path=None):
+        self.symbols = symbols
+        self.latency = latency
+        self.calls = 0
+        self.calls_path = calls_path
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.calls += 1
+        if self.calls_path:
+            fd = os.open(self.calls_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b".")
+            finally:
+                os.close(fd)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def total_calls(self):
+        if self.calls_path:
+            try:
+                return os.path.getsize(self.calls_path)
+            except FileNotFoundError:
+                return 0
+        return self.calls
+
+    @staticmethod
+    def seed(symbol):
+        return int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+    def install(self):
+        """Register stub vnstock modules; must run before backend_server is imported"""
+        import pandas as pd
+        stub = self
+
+        class Listing:
+            def all_symbols(self):
+                stub.call()
+                return pd.DataFrame({"symbol": stub.symbols})
+
+            def symbols_by_industries(self):
+                stub.call()
+                sectors = ["Ngân hàng", "Bất động sản", "Công nghệ", "Thực phẩm", "Thép"]
+                return pd.DataFrame({
+                    "symbol": stub.symbols,
+                    "icb_name2": [sectors[int(stub.seed(s) * len(sectors))] for s in stub.symbols],
+                })
+
+        class Trading:
+            def __init__(self, symbol=None):
+                pass
+
+            def price_board(self, symbols):
+                stub.call()
+                return pd.DataFrame({
+                    ("listing", "symbol"): list(symbols),
+                    ("match", "match_price"): [10000 + round(stub.seed(s) * 90000, -2) for s in symbols],
+                })
+
+        class Company:
+            def __init__(self, symbol):
+                self.symbol = symbol
+
+            def ratio_summary(self):
+                stub.call()
+                x = stub.seed(self.symbol)
+                return pd.DataFrame([{
+                    "revenue": 1e12 * (1 + 10 * x), "net_profit": 1e11 * (1 + 10 * x), "revenue_growth": 0.1 * x,
+                    "net_profit_margin": 0.05 + 0.2 * x, "roe": 0.05 + 0.2 * x, "roa": 0.02 + 0.05 * x,
+                    "pe": 5 + 20 * x, "pb": 0.5 + 3 * x, "ev_per_ebitda": 4 + 10 * x,
+                    "eps": 1000 + 5000 * x, "bvps": 10000 + 20000 * x, "de": x, "ae": 1.5 + x,
+                    "issue_share": 1e8 * (1 + 10 * x), "ebitda": 2e11 * (1 + 10 * x), "ebit": 1.5e11 * (1 + 10 * x),
+                }])
+
+        class Stock:
+            def __init__(self, symbol):
+                self.listing = Listing()
+                self.trading = Trading(symbol)
+
+        class Vnstock:
+            def stock(self, symbol, source):
+                return Stock(symbol)
+
+        vnstock = types.ModuleType("vnstock")
+        vnstock.Vnstock = Vnstock
+        explorer = types.ModuleType("vnstock.explorer")
+        vci = types.ModuleType("vnstock.explorer.vci")
+        vci.Company = Company
+        vci.Trading = Trading
+        vnstock.explorer = explorer
+        explorer.vci = vci
+        sys.modules.update({"vnstock": vnstock, "vnstock.explorer": explorer, "vnstock.explorer.vci": vci})
+
+
+def _stubbed_app(stub):
+    """Install stub, import the backend and expose the stub's call count on the app"""
+    stub.install()
+    from flask import jsonify
+    from backend_server import app
+
+    app.add_url_rule(STUB_CALLS_PATH, "stub_calls", lambda: jsonify({"calls": stub.total_calls()}))
+    return app
+
+
+def stub_app():
+    """
+    WSGI app factory for running the stubbed backend under a real server, e.g.
+        gunicorn -w 4 'load_replay:stub_app()'
+    Configured by STUB_SYMBOLS (comma separated listing), STUB_LATENCY_MS and
+    STUB_CALLS_FILE (shared call counter, defaults to one in the temp dir).
+    """
+    symbols = [s.strip().upper() for s in os.environ.get("STUB_SYMBOLS", "").split(",") if s.strip()]
+    latency = float(os.environ.get("STUB_LATENCY_MS", "50")) / 1000
+    calls_path = os.environ.get("STUB_CALLS_FILE") or os.path.join(tempfile.gettempdir(), "vnstock_stub_calls")
+    return _stubbed_app(StubVCI(symbols, latency, calls_path))
+
+
+def start_stub_server(symbols, latency):
+    """Run the Flask app in-process on a free port against the stubbed backend"""
+    from werkzeug.serving import make_server
+
+    app = _stubbed_app(StubVCI(symbols, latency))
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+# --- replay -------------------------------------------------------------------
+
+def _get(url, timeout):
+    """(status, body) of a GET, status 0 on connection errors and timeouts"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, b""
+    except Exception:
+        return 0, b""
+
+
+def wait_until_ready(target, timeout=300.0, streak=20):
+    """
+    Poll /ready until it has answered 200 streak times in a row. Each probe may land on
+    a different worker and a worker starts warming up on its first request, so a streak
+    is what shows that the workers being probed have all finished their warm-up.
+    """
+    deadline = time.monotonic() + timeout
+    ok = 0
+    while ok < streak:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{target} was not ready after {timeout:.0f}s")
+        status, _ = _get(target + "/ready", timeout=5)
+        ok = ok + 1 if status == 200 else 0
+        if not ok:
+            time.sleep(0.5)
+
+
+def read_upstream_calls(target):
+    """Stubbed VCI calls made so far by the target, or None if it is not running the stub"""
+    status, body = _get(target + STUB_CALLS_PATH, timeout=5)
+    if status != 200:
+        return None
+    try:
+        return int(json.loads(body)["calls"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _send(target, path, timeout, scheduled):
+    """
+    Latency runs from the scheduled send time, not from when a pool thread got to the
+    request, so time spent queued behind a saturated client counts (no coordinated omission)
+    """
+    started = time.perf_counter()
+    status, _ = _get(target + path, timeout)
+    finished = time.perf_counter()
+    return path, status, finished - scheduled, finished - started, started - scheduled
+
+
+def replay(entries, target, speed=1.0, concurrency=64, timeout=30.0):
+    """
+    Send every entry at its original offset / speed.
+    Returns ([(path, status, latency, service_time, queue_delay)], elapsed)
+    """
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for offset, path in entries:
+            scheduled = start + offset / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(_send, target, path, timeout, scheduled))
+        for future in futures:
+            results.append(future.result())
+    return results, time.perf_counter() - start
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(results, elapsed, upstream_calls=None):
+    def stats(rows):
+        latencies = sorted(r[2] * 1000 for r in rows)
+        service = sorted(r[3] * 1000 for r in rows)
+        errors = sum(1 for r in rows if r[1] == 0 or r[1] >= 500)
+        return {
+            "requests": len(rows),
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "p50_ms": _percentile(latencies, 50),
+            "p90_ms": _percentile(latencies, 90),
+            "p99_ms": _percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else None,
+            "service_p50_ms": _percentile(service, 50),
+            "service_p99_ms": _percentile(service, 99),
+        }
+
+    # Time requests waited for a free client thread after their scheduled send time;
+    # if this is large the client, not the server, was the bottleneck
+    queue_delays = sorted(r[4] * 1000 for r in results)
+
+    by_endpoint = {}
+    for row in results:
+        endpoint = "/" + "/".join(row[0].split("?")[0].strip("/").split("/")[:2])
+        by_endpoint.setdefault(endpoint, []).append(row)
+
+    return {
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed > 0 else None,
+        **stats(results),
+        "client_backlog": {
+            "delayed_requests": sum(1 for d in queue_delays if d > 10),
+            "p99_queue_delay_ms": _percentile(queue_delays, 99),
+            "max_queue_delay_ms": queue_delays[-1] if queue_delays else None,
+        },
+        "upstream_calls": upstream_calls,
+        "upstream_calls_per_request": upstream_calls / len(results) if upstream_calls is not None and results else None,
+        "endpoints": {endpoint: stats(rows) for endpoint, rows in sorted(by_endpoint.items())},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded access logs against the backend")
+    parser.add_argument("log", help="Access log file ('-' for stdin)")
+    parser.add_argument("--target", default=None, help="Base URL of a running server (default: in-process stub)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Timing multiplier; 2 replays twice as fast")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0, help="Latency of each stubbed VCI call")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N requests")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Seconds to wait for /ready")
+    args = parser.parse_args(argv)
+
+    with (sys.stdin if args.log == "-" else open(args.log, encoding="utf-8")) as f:
+        entries = parse_log(f)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        parser.error("No replayable requests found in the log")
+
+    server = None
+    target = args.target
+    if target is None:
+        target, server = start_stub_server(symbols_in(entries), args.stub_latency_ms / 1000)
+    target = target.rstrip("/")
+
+    wait_until_ready(target, args.ready_timeout)
+    # Calls made by warm-up and the readiness probes are not part of the replay
+    baseline = read_upstream_calls(target)
+    results, elapsed = replay(entries, target, args.speed, args.concurrency, args.timeout)
+    calls = read_upstream_calls(target)
+    if server is not None:
+        server.shutdown()
+    if calls is not None and baseline is not None:
+        calls -= baseline
+    print(json.dumps(report(results, elapsed, calls), indent=2))
+
+if __name__ == "__main__":
+    main()
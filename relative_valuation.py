@@ -0,0 +1,155 @@
+# relative_valuation.py
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+# Multiples are only meaningful when positive; profitability metrics keep negative values
+MULTIPLE_METRICS = ["pe_ratio", "pb_ratio", "ev_ebitda"]
+PROFITABILITY_METRICS = ["roe", "net_profit_margin"]
+RELATIVE_METRICS = MULTIPLE_METRICS + PROFITABILITY_METRICS
+# Fewer peers than this and sector medians/percentiles are too noisy to report
+MIN_PEERS = 5
+
+
+def _clean(metric, value):
+    """Return a float usable in the sector distribution, or None"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value) or math.isinf(value):
+        return None
+    if metric in MULTIPLE_METRICS and value <= 0:
+        return None
+    return value
+
+
+class SectorAggregates:
+    """
+    Per-sector sorted value lists for each relative metric.
+
+    update() replaces one symbol's contribution in O(log n + n_sector) with
+    bisect, so medians and percentiles are always available without scanning
+    the market at request time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sorted = {}   # (sector, metric) -> sorted list of values
+        self._members = {}  # symbol -> (sector, {metric: value})
+        self._counts = {}   # sector -> number of member symbols
+
+    def update(self, symbol, sector, data):
+        """Insert or refresh one symbol's metrics, moving it between sectors if needed"""
+        values = {}
+        for metric in RELATIVE_METRICS:
+            v = _clean(metric, data.get(metric))
+            if v is not None:
+                values[metric] = v
+
+        with self._lock:
+            self._remove(symbol)
+            for metric, v in values.items():
+                insort(self._sorted.setdefault((sector, metric), []), v)
+            self._members[symbol] = (sector, values)
+            self._counts[sector] = self._counts.get(sector, 0) + 1
+
+    def remove(self, symbol):
+        with self._lock:
+            self._remove(symbol)
+
+    def _remove(self, symbol):
+        previous = self._members.pop(symbol, None)
+        if previous is None:
+            return
+        sector, values = previous
+        self._counts[sector] -= 1
+        for metric, v in values.items():
+            bucket = self._sorted[(sector, metric)]
+            del bucket[bisect_left(bucket, v)]
+
+    def sector_of(self, symbol):
+        member = self._members.get(symbol)
+        return member[0] if member else None
+
+    def peer_count(self, sector, exclude=None):
+        """Symbols in sector, not counting exclude (the symbol being valued)"""
+        count = self._counts.get(sector, 0)
+        return count - 1 if exclude is not None and self.sector_of(exclude) == sector else count
+
+    def _peers(self, sector, metric, exclude=None):
+        """Sorted sector values for metric with exclude's own value taken out"""
+        bucket = self._sorted.get((sector, metric)) or []
+        member = self._members.get(exclude) if exclude is not None else None
+        if member is None or member[0] != sector or metric not in member[1]:
+            return bucket
+        i = bisect_left(bucket, member[1][metric])
+        return bucket[:i] + bucket[i + 1:]
+
+    def median(self, sector, metric, exclude=None):
+        bucket = self._peers(sector, metric, exclude)
+        if not bucket:
+            return None
+        n = len(bucket)
+        mid = n // 2
+        return bucket[mid] if n % 2 else (bucket[mid - 1] + bucket[mid]) / 2
+
+    def percentile(self, sector, metric, value, exclude=None):
+        """Mid-rank percentile (0-100) of value within the sector distribution"""
+        value = _clean(metric, value)
+        bucket = self._peers(sector, metric, exclude)
+        if value is None or not bucket:
+            return None
+        rank = (bisect_left(bucket, value) + bisect_right(bucket, value)) / 2
+        return rank / len(bucket) * 100
+
+    def relative_valuation(self, symbol, sector, data):
+        """
+        Percentiles against sector peers plus a fair value per share from sector median multiples.
+        data uses the field names of StockDataProvider._get_vci_data. The symbol itself is never
+        one of its own peers; with fewer than MIN_PEERS peers nothing is ranked or valued.
+        """
+        with self._lock:
+            peer_count = self.peer_count(sector, exclude=symbol)
+            enough_peers = peer_count >= MIN_PEERS
+            metrics = {}
+            for metric in RELATIVE_METRICS:
+                metrics[metric] = {
+                    "value": _clean(metric, data.get(metric)),
+                    "sector_median": self.median(sector, metric, exclude=symbol) if enough_peers else None,
+                    "percentile": self.percentile(sector, metric, data.get(metric), exclude=symbol)
+                    if enough_peers else None,
+                }
+
+        fair_values = {}
+        eps = _clean("pe_ratio", data.get("eps_ttm")) or _clean("pe_ratio", data.get("eps"))
+        if eps and metrics["pe_ratio"]["sector_median"]:
+            fair_values["pe"] = metrics["pe_ratio"]["sector_median"] * eps
+
+        bvps = _clean("pb_ratio", data.get("bvps"))
+        if bvps and metrics["pb_ratio"]["sector_median"]:
+            fair_values["pb"] = metrics["pb_ratio"]["sector_median"] * bvps
+
+        ebitda = _clean("ev_ebitda", data.get("ebitda"))
+        ev = _clean("ev_ebitda", data.get("enterprise_value"))
+        shares = _clean("pe_ratio", data.get("shares_outstanding"))
+        price = _clean("pe_ratio", data.get("current_price"))
+        if ebitda and ev and shares and price and metrics["ev_ebitda"]["sector_median"]:
+            # VCI gives EV but not cash, so net debt is backed out as EV - market cap
+            net_debt = ev - price * shares
+            equity_value = metrics["ev_ebitda"]["sector_median"] * ebitda - net_debt
+            if equity_value > 0:
+                fair_values["ev_ebitda"] = equity_value / shares
+
+        fair_value = sum(fair_values.values()) / len(fair_values) if fair_values else None
+        upside = (fair_value / price - 1) * 100 if fair_value and price else None
+
+        return {
+            "symbol": symbol,
+            "sector": sector,
+            "peer_count": peer_count,
+            "insufficient_peers": not enough_peers,
+            "metrics": metrics,
+            "fair_value_by_multiple": fair_values,
+            "fair_value": fair_value,
+            "upside_pct": upside,
+        }
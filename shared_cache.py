@@ -0,0 +1,180 @@
+# shared_cache.py
+import fcntl
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+MAGIC = b"VNSNAP01"
+_HEADER_LEN = struct.Struct("<I")
+
+
+def default_cache_dir():
+    """Node-local RAM-backed directory when available, otherwise the temp dir"""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedTable:
+    """
+    Float64 table (symbols x fields) shared by every worker process on a node.
+
+    Each publish writes a complete, immutable snapshot file and atomically
+    swaps it in with os.replace, bumping the version stored in its header.
+    Readers mmap the current file and view it with np.frombuffer, so all
+    workers share one page-cache copy and nothing is unpickled. A reader
+    notices a new version by the inode of the snapshot path changing, and
+    a mapping it already holds stays valid until it remaps.
+    """
+    def __init__(self, name, fields, directory=None):
+        self.name = name
+        self.fields = list(fields)
+        self.directory = directory or default_cache_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{name}.snap")
+        self._lock_path = os.path.join(self.directory, f"{name}.lock")
+        self._refresh_lock_path = os.path.join(self.directory, f"{name}.refresh")
+        self._refresh_fd = None
+        self._local_lock = threading.Lock()
+        self._inode = None
+        self._mmap = None
+        self._snapshot = (0, [], {}, np.empty((0, len(self.fields))))
+
+    def _load(self):
+        """Return (version, symbols, index, values), remapping if a newer snapshot exists"""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return self._snapshot
+        if inode == self._inode:
+            return self._snapshot
+
+        with self._local_lock:
+            if inode == self._inode:
+                return self._snapshot
+            with open(self.path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mm[:len(MAGIC)] != MAGIC:
+                mm.close()
+                return self._snapshot
+            header_len = _HEADER_LEN.unpack_from(mm, len(MAGIC))[0]
+            header_start = len(MAGIC) + _HEADER_LEN.size
+            header = json.loads(mm[header_start:header_start + header_len].decode("utf-8"))
+            if header["fields"] != self.fields:
+                # Written by a build with a different field layout; ignore until republished
+                mm.close()
+                return self._snapshot
+            symbols = header["symbols"]
+            values = np.frombuffer(
+                mm, dtype="<f8", count=len(symbols) * len(self.fields), offset=header["data_offset"]
+            ).reshape(len(symbols), len(self.fields))
+            # The previous mmap is left to the GC; numpy views of it may still be in use
+            self._mmap = mm
+            self._inode = inode
+            self._snapshot = (header["version"], symbols, {s: i for i, s in enumerate(symbols)}, values)
+            return self._snapshot
+
+    @property
+    def version(self):
+        return self._load()[0]
+
+    def symbols(self):
+        return list(self._load()[1])
+
+    def get_row(self, symbol):
+        """Return the row for symbol as a dict of floats, or None if it is not in the snapshot"""
+        _, _, index, values = self._load()
+        i = index.get(symbol)
+        if i is None:
+            return None
+        return dict(zip(self.fields, values[i].tolist()))
+
+    def to_arrays(self):
+        """Return (symbols, values) for whole-table vectorised work; values is read-only"""
+        _, symbols, _, values = self._load()
+        return list(symbols), values
+
+    def publish(self, rows, replace=False):
+        """
+        Merge rows ({symbol: {field: value}}) into the table and swap in a new version.
+        With replace=True the snapshot contains only the given rows.
+        """
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                version, symbols, index, values = self._load()
+                if replace:
+                    symbols, index, values = [], {}, np.empty((0, len(self.fields)))
+                symbols = list(symbols)
+                new_symbols = [s for s in rows if s not in index]
+                table = np.full((len(symbols) + len(new_symbols), len(self.fields)), np.nan)
+                table[:len(symbols)] = values
+                index = dict(index)
+                for s in new_symbols:
+                    index[s] = len(symbols)
+                    symbols.append(s)
+                for s, row in rows.items():
+                    table[index[s]] = [row.get(f, np.nan) for f in self.fields]
+                self._write(version + 1, symbols, table)
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        return self._load()[0]
+
+    def remove(self, symbols):
+        """Drop symbols from the table (under the publish lock) and swap in a new version"""
+        drop = set(symbols)
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                version, current, index, values = self._load()
+                keep = [s for s in current if s not in drop]
+                if len(keep) == len(current):
+                    return version
+                self._write(version + 1, keep, values[[index[s] for s in keep]])
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        return self._load()[0]
+
+    def _write(self, version, symbols, table):
+        header = {"version": version, "fields": self.fields, "symbols": symbols}
+        # data_offset depends on the header length, so size the header with a placeholder first
+        header["data_offset"] = 0
+        header_bytes = json.dumps(header).encode("utf-8")
+        offset = len(MAGIC) + _HEADER_LEN.size + len(header_bytes) + 32
+        offset += -offset % 8
+        header["data_offset"] = offset
+        header_bytes = json.dumps(header).encode("utf-8")
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LEN.pack(len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(np.ascontiguousarray(table, dtype="<f8").tobytes())
+        os.replace(tmp_path, self.path)
+
+    @property
+    def is_refresher(self):
+        return self._refresh_fd is not None
+
+    def try_become_refresher(self):
+        """
+        Non-blocking attempt to become the single worker that refreshes this table.
+        The lock is held for the life of the process and released by the OS on exit,
+        so another worker takes over if the refresher dies.
+        """
+        if self._refresh_fd is not None:
+            return True
+        fd = os.open(self._refresh_lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._refresh_fd = fd
+        return True
@@ -0,0 +1,151 @@
+# snapshots.py
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FILE = "valuations.parquet"
+LATEST_FILE = "LATEST"
+
+
+class SnapshotStore:
+    """
+    Versioned full-market valuation snapshots on disk.
+
+    Layout:
+        <root>/<version>/valuations.parquet   one row per symbol
+        <root>/<version>/checkpoint.jsonl     per-symbol fetch results while a run is in progress
+        <root>/<version>/prices.json          price board of the run
+        <root>/LATEST                         name of the newest complete version
+
+    Versions are run dates (YYYYMMDD) so they sort chronologically and a crashed
+    run resumes into the same directory.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._loaded = {}  # version -> ((mtime_ns, inode), DataFrame indexed by symbol)
+
+    def version_dir(self, version):
+        path = os.path.join(self.root, version)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def versions(self):
+        """Complete snapshot versions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            v for v in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, v, SNAPSHOT_FILE))
+        )
+
+    def latest_version(self):
+        try:
+            with open(os.path.join(self.root, LATEST_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            versions = self.versions()
+            return versions[-1] if versions else None
+
+    def previous_version(self, version):
+        older = [v for v in self.versions() if v < version]
+        return older[-1] if older else None
+
+    # --- checkpointing -------------------------------------------------
+
+    def load_checkpoint(self, version):
+        """Symbol -> fundamentals already fetched by an earlier (possibly crashed) run"""
+        done = {}
+        path = os.path.join(self.version_dir(version), "checkpoint.jsonl")
+        if not os.path.exists(path):
+            return done
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from a crash
+                done[record["symbol"]] = record["data"]
+        return done
+
+    def append_checkpoint(self, version, symbol, data):
+        line = json.dumps({"symbol": symbol, "data": data}, ensure_ascii=False, allow_nan=True)
+        path = os.path.join(self.version_dir(version), "checkpoint.jsonl")
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def load_prices(self, version):
+        path = os.path.join(self.version_dir(version), "prices.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_prices(self, version, prices):
+        path = os.path.join(self.version_dir(version), "prices.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(prices, f)
+
+    # --- snapshots -----------------------------------------------------
+
+    def write(self, version, frame):
+        """
+        Write the snapshot and only then point LATEST at it, unless a newer version is
+        already current (a backfill of an older date must not replace it)
+        """
+        path = os.path.join(self.version_dir(version), SNAPSHOT_FILE)
+        frame.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+        current = self.latest_version()
+        if current is not None and current > version:
+            return
+        latest_tmp = os.path.join(self.root, LATEST_FILE + ".tmp")
+        with open(latest_tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(latest_tmp, os.path.join(self.root, LATEST_FILE))
+
+    def load(self, version):
+        """
+        Snapshot as a DataFrame indexed by symbol, kept in memory after the first read.
+        The cache is keyed on the file's mtime and inode too, so re-running a version
+        (which replaces the file) is picked up on the next load.
+        """
+        path = os.path.join(self.root, version, SNAPSHOT_FILE)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_ino)
+        cached = self._loaded.get(version)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        frame = pd.read_parquet(path).set_index("symbol")
+        with self._lock:
+            # Only the latest couple of versions are served; drop older ones
+            for old in sorted(self._loaded)[:-3]:
+                del self._loaded[old]
+            self._loaded[version] = (key, frame)
+        return frame
+
+    def diff(self, version, metric="weighted_average", previous=None):
+        """
+        Day-over-day change of metric for every symbol present in both versions,
+        sorted by absolute percentage change (largest first)
+        """
+        previous = previous or self.previous_version(version)
+        if previous is None:
+            return None, pd.DataFrame()
+        current, before = self.load(version), self.load(previous)
+        joined = pd.DataFrame({
+            # An older snapshot may predate the column
+            "previous": before.get(metric, pd.Series(dtype=float)),
+            "current": current[metric],
+        }).dropna()
+        joined["change"] = joined["current"] - joined["previous"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            joined["change_pct"] = np.where(
+                joined["previous"] != 0, joined["change"] / joined["previous"].abs() * 100, np.nan
+            )
+        joined = joined.reindex(joined["change_pct"].abs().sort_values(ascending=False, na_position="last").index)
+        return previous, joined
@@ -1,10 +1,363 @@
 import numpy as np
 import pandas as pd
 
+
+DEFAULT_ASSUMPTIONS = {
+    'revenue_growth': 0.08,
+    'terminal_growth': 0.03,
+    'wacc': 0.10,
+    'required_return_equity': 0.12,
+    'tax_rate': 0.20,
+    'projection_years': 5,
+    'fade_years': 0,
+    'capex_rate': 0.04,
+    'working_capital_rate': 0.02,
+    'payout_ratio': 0.3,
+    'model_weights': {'dcf': 0.5, 'fcfe': 0.5}
+}
+
+
+MODELS = ('dcf', 'fcfe', 'ddm')
+SOLVE_FOR = ('revenue_growth', 'discount_rate')
+# Fade years are valued year by year (arrays of years x symbols), so the horizon is bounded
+MAX_PROJECTION_YEARS = 50
+
+
+def check_projection_years(assumptions):
+    """Raise ValueError unless the projection horizon is whole years within MAX_PROJECTION_YEARS"""
+    if assumptions.get('stages'):
+        stages = assumptions['stages']
+        if not isinstance(stages, list) or not all(isinstance(stage, dict) for stage in stages):
+            raise ValueError("stages must be a list of objects")
+        years = [stage.get('years') for stage in stages]
+    else:
+        years = [assumptions.get('projection_years', DEFAULT_ASSUMPTIONS['projection_years']),
+                 assumptions.get('fade_years', 0)]
+    for value in years:
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value) or value < 0:
+            raise ValueError(f"Projection years must be whole non-negative numbers, got {value!r}")
+    if sum(years) > MAX_PROJECTION_YEARS:
+        raise ValueError(f"Projection horizon is limited to {MAX_PROJECTION_YEARS} years")
+
+
+def _field(stock_data_list, key, default=0.0):
+    """Column of stock_data values as float64, missing keys filled with the scalar model's default"""
+    values = [d.get(key, default) for d in stock_data_list]
+    return np.array([default if v is None else float(v) for v in values], dtype=float)
+
+
+def dcf_inputs(stock_data_list):
+    """Arrays the vectorized DCF needs, one entry per stock_data dict"""
+    return {
+        'revenue': _field(stock_data_list, 'revenue_ttm'),
+        'ebit': _field(stock_data_list, 'ebit'),
+        'depreciation': _field(stock_data_list, 'depreciation'),
+        'total_debt': _field(stock_data_list, 'total_debt'),
+        'cash': _field(stock_data_list, 'cash'),
+        'shares': _field(stock_data_list, 'shares_outstanding', 1000000000),
+    }
+
+
+def fcfe_inputs(stock_data_list):
+    """Arrays the vectorized FCFE needs, with the same base-FCFE fallbacks as calculate_fcfe"""
+    fcfe = _field(stock_data_list, 'fcfe')
+    net_income = _field(stock_data_list, 'net_income_ttm')
+    estimate = net_income + _field(stock_data_list, 'depreciation') - np.abs(_field(stock_data_list, 'capex'))
+    estimate = np.where((estimate <= 0) & (net_income > 0), net_income * 0.7, estimate)
+    return {
+        'fcfe': np.where(fcfe <= 0, estimate, fcfe),
+        'shares': _field(stock_data_list, 'shares_outstanding', 1000000000),
+    }
+
+
+def ddm_inputs(stock_data_list, payout_ratio=0.3):
+    """Dividend per share, falling back to EPS x payout when no dividend is reported"""
+    dividend = _field(stock_data_list, 'dividend_per_share')
+    eps = _field(stock_data_list, 'earnings_per_share', np.nan)
+    eps = np.where(np.isnan(eps), _field(stock_data_list, 'eps'), eps)
+    return {'dividend': np.where(dividend > 0, dividend, np.nan_to_num(eps) * payout_ratio)}
+
+
+STAGE_DEFAULTS = {'margin': 1.0, 'capex': 0.0, 'reinvestment': 0.0}
+_STAGE_PARAMS = ('growth', 'margin', 'capex', 'reinvestment')
+# Stage keys that describe the driver itself; margin/capex/reinvestment only make sense for DCF
+_DRIVER_STAGE_KEYS = ('years', 'growth', 'fade')
+
+
+def growing_annuity_pv(first_cash_flow, rate, growth, periods):
+    """Closed-form PV of `periods` cash flows, the first one period out, growing at `growth`"""
+    rate = np.asarray(rate, dtype=float)
+    growth = np.asarray(growth, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pv = first_cash_flow * (1 - ((1 + growth) / (1 + rate)) ** periods) / (rate - growth)
+    # When rate == growth every discounted flow equals CF1 / (1 + rate)
+    return np.where(np.isclose(rate, growth), first_cash_flow * periods / (1 + rate), pv)
+
+
+def _cash_conversion(params, tax_rate, depreciation_rate):
+    """Share of the driver paid out as cash flow in a year"""
+    return (params['margin'] * (1 - tax_rate) + depreciation_rate
+            - params['capex'] - params['growth'] * params['reinvestment'])
+
+
+def project_multi_stage(base, rate, stages, terminal, tax_rate=0.0, depreciation_rate=0.0):
+    """
+    Present value of a driver projected through consecutive stages plus a Gordon terminal value.
+
+    base is today's driver (revenue for FCFF, FCFE, or dividend per share). Each stage is
+    {'years', 'growth', 'margin', 'capex', 'reinvestment'}, and the cash flow of a year is
+        driver_t * (margin * (1 - tax_rate) + depreciation_rate - capex - growth_t * reinvestment)
+    which with the defaults (margin 1, no capex/reinvestment) is the driver itself.
+    A stage with 'fade': True moves every parameter linearly from the previous stage to the
+    next stage with explicit parameters (or terminal), reaching its value in the last fade
+    year. Consecutive fade stages split one straight fade between them.
+
+    Constant stages are discounted with the closed-form growing annuity; only fade years are
+    summed explicitly. All parameters broadcast, so one call values one symbol or thousands.
+    """
+    driver = np.asarray(base, dtype=float)
+    rate = np.asarray(rate, dtype=float)
+    stages = [{**STAGE_DEFAULTS, **stage} for stage in stages]
+    terminal = {**STAGE_DEFAULTS, **terminal}
+    discount = np.ones_like(driver)
+    stage_pv = []
+
+    for i, stage in enumerate(stages):
+        years = int(stage['years'])
+        if years <= 0:
+            stage_pv.append(np.zeros_like(driver))
+            continue
+
+        if stage.get('fade'):
+            if i == 0:
+                raise ValueError("A fade stage needs a preceding stage to fade from")
+            start = stages[i - 1]
+            # Fade towards the next stage that sets its own parameters, spreading the
+            # move over every fade year still left before it
+            j, remaining = i, 0
+            while j < len(stages) and stages[j].get('fade'):
+                remaining += max(int(stages[j]['years']), 0)
+                j += 1
+            end = stages[j] if j < len(stages) else terminal
+            shape = (-1,) + (1,) * np.ndim(driver)
+            weight = (np.arange(1, years + 1) / remaining).reshape(shape)
+            params = {k: start[k] + (np.asarray(end[k]) - start[k]) * weight for k in _STAGE_PARAMS}
+            drivers = driver * np.cumprod(1 + params['growth'], axis=0)
+            factors = discount * (1 + rate) ** -np.arange(1, years + 1).reshape(shape)
+            pv = (drivers * _cash_conversion(params, tax_rate, depreciation_rate) * factors).sum(axis=0)
+            driver = drivers[-1]
+            # Later stages fade from where this one ended
+            stages[i] = {k: params[k][-1] for k in _STAGE_PARAMS}
+        else:
+            if 'growth' not in stage:
+                raise ValueError(f"Stage {i + 1} needs a 'growth' rate or 'fade': true")
+            growth = stage['growth']
+            first_cash_flow = driver * (1 + growth) * _cash_conversion(stage, tax_rate, depreciation_rate)
+            pv = discount * growing_annuity_pv(first_cash_flow, rate, growth, years)
+            driver = driver * (1 + growth) ** years
+
+        discount = discount * (1 + rate) ** -years
+        stage_pv.append(pv)
+
+    growth = np.asarray(terminal['growth'], dtype=float)
+    terminal_cash_flow = driver * (1 + growth) * _cash_conversion(terminal, tax_rate, depreciation_rate)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terminal_value = np.where(rate > growth, terminal_cash_flow / (rate - growth), np.nan)
+    terminal_pv = terminal_value * discount
+
+    return {
+        'stage_pv': stage_pv,
+        'terminal_value': terminal_value,
+        'terminal_pv': terminal_pv,
+        'total_pv': sum(stage_pv) + terminal_pv,
+    }
+
+
+def stages_from_assumptions(assumptions, revenue_growth=None):
+    """
+    Projection stages for the flat assumption dict: an explicit 'stages' list, or
+    projection_years at revenue_growth followed by an optional fade over fade_years.
+    revenue_growth, when given, overrides the growth of the first stage.
+    """
+    if assumptions.get('stages'):
+        stages = [dict(stage) for stage in assumptions['stages']]
+    else:
+        stages = [{'years': assumptions.get('projection_years', 5),
+                   'growth': assumptions.get('revenue_growth', 0.08)}]
+        if assumptions.get('fade_years', 0) > 0:
+            stages.append({'years': assumptions['fade_years'], 'fade': True})
+    if revenue_growth is not None:
+        stages[0]['growth'] = revenue_growth
+    return stages
+
+
+def dcf_per_share_vectorized(inputs, stages, wacc, terminal_growth=0.03, tax_rate=0.20,
+                             capex_rate=0.04, working_capital_rate=0.02):
+    """
+    Array form of ValuationModels.calculate_dcf over any stage layout. Stages without their
+    own margin use the company's current EBIT margin; the terminal year has no working
+    capital build, as in calculate_dcf.
+    """
+    revenue = inputs['revenue']
+    has_revenue = revenue > 0
+    safe_revenue = np.where(has_revenue, revenue, 1.0)
+    ebit_margin = np.where(has_revenue, inputs['ebit'] / safe_revenue, 0.15)
+    depreciation_rate = np.where(has_revenue, inputs['depreciation'] / safe_revenue, 0.04)
+
+    defaults = {'margin': ebit_margin, 'capex': capex_rate, 'reinvestment': working_capital_rate}
+    stages = [{**defaults, **stage} for stage in stages]
+    terminal = {**defaults, 'reinvestment': 0.0, 'growth': terminal_growth}
+
+    projection = project_multi_stage(revenue, wacc, stages, terminal, tax_rate, depreciation_rate)
+    equity_value = projection['total_pv'] - (inputs['total_debt'] - inputs['cash'])
+    return np.nan_to_num(np.maximum(equity_value / inputs['shares'], 0), nan=0.0)
+
+
+def driver_stages(stages):
+    """Stages reduced to years/growth/fade, for models whose driver already is the cash flow"""
+    return [{k: stage[k] for k in _DRIVER_STAGE_KEYS if k in stage} for stage in stages]
+
+
+def fcfe_per_share_vectorized(inputs, stages, required_return, terminal_growth=0.03):
+    """Array form of ValuationModels.calculate_fcfe over any stage layout"""
+    projection = project_multi_stage(inputs['fcfe'], required_return, driver_stages(stages),
+                                     {'growth': terminal_growth})
+    return np.nan_to_num(np.maximum(projection['total_pv'] / inputs['shares'], 0), nan=0.0)
+
+
+def ddm_per_share_vectorized(inputs, stages, required_return, terminal_growth=0.03):
+    """Multi-stage dividend discount model; the driver is already per share"""
+    projection = project_multi_stage(inputs['dividend'], required_return, driver_stages(stages),
+                                     {'growth': terminal_growth})
+    return np.nan_to_num(np.maximum(projection['total_pv'], 0), nan=0.0)
+
+
+def model_inputs(model, stock_data_list, assumptions=None):
+    """Input arrays for model ('dcf', 'fcfe' or 'ddm'), built once per batch"""
+    if model == 'dcf':
+        return dcf_inputs(stock_data_list)
+    if model == 'fcfe':
+        return fcfe_inputs(stock_data_list)
+    if model == 'ddm':
+        return ddm_inputs(stock_data_list, (assumptions or {}).get('payout_ratio', 0.3))
+    raise ValueError(f"Unsupported model {model}")
+
+
+def model_per_share_vectorized(model, inputs, assumptions, revenue_growth=None, discount_rate=None):
+    """
+    Value per share for every symbol in inputs (from model_inputs) under one model.
+    revenue_growth / discount_rate may be arrays (one per symbol) overriding the assumptions.
+    """
+    a = {**DEFAULT_ASSUMPTIONS, **assumptions}
+    stages = stages_from_assumptions(a, revenue_growth)
+    if model == 'dcf':
+        rate = a['wacc'] if discount_rate is None else discount_rate
+        return dcf_per_share_vectorized(inputs, stages, rate, a['terminal_growth'], a['tax_rate'],
+                                        a.get('capex_rate', 0.04), a.get('working_capital_rate', 0.02))
+    rate = a.get('required_return_equity', a.get('requiredReturn', 0.12)) if discount_rate is None else discount_rate
+    if model == 'fcfe':
+        return fcfe_per_share_vectorized(inputs, stages, rate, a['terminal_growth'])
+    if model == 'ddm':
+        return ddm_per_share_vectorized(inputs, stages, rate, a['terminal_growth'])
+    raise ValueError(f"Unsupported model {model}")
+
+
+def solve_implied_parameter(value_fn, target, low, high, tol=1e-6, max_iter=100):
+    """
+    Bracketed bisection run for all symbols at once.
+
+    value_fn maps an array of parameter values (one per symbol) to values per share.
+    Returns the parameter plus per-symbol diagnostics; symbols whose bracket does not
+    straddle the target are reported with status 'no_bracket' instead of a guess.
+    """
+    target = np.asarray(target, dtype=float)
+    low = np.full(target.shape, low, dtype=float)
+    high = np.full(target.shape, high, dtype=float)
+    f_low = value_fn(low) - target
+    f_high = value_fn(high) - target
+
+    bracketed = (np.sign(f_low) != np.sign(f_high)) & np.isfinite(target) & (target > 0)
+    # Orient every bracket so f(low) < 0 < f(high) whatever the direction of the model
+    swap = f_low > 0
+    low, high = np.where(swap, high, low), np.where(swap, low, high)
+
+    iterations = np.zeros(target.shape, dtype=int)
+    active = bracketed.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        mid = (low + high) / 2
+        f_mid = value_fn(mid) - target
+        below = f_mid < 0
+        low = np.where(active & below, mid, low)
+        high = np.where(active & ~below, mid, high)
+        iterations += active
+        active &= np.abs(high - low) > tol
+
+    solution = np.where(bracketed, (low + high) / 2, np.nan)
+    residual = np.where(bracketed, value_fn(np.nan_to_num(solution)) - target, np.nan)
+    status = np.where(~bracketed, 'no_bracket', np.where(active, 'max_iter', 'converged'))
+    return {
+        'value': solution,
+        'converged': status == 'converged',
+        'status': status,
+        'iterations': iterations,
+        'residual': residual,
+    }
+
+
+def implied_parameter_batch(stock_data_list, prices, assumptions=None, model='dcf', solve_for='revenue_growth',
+                            low=None, high=None):
+    """
+    Revenue growth (or discount rate) that makes the model value equal today's price,
+    solved for many symbols in one vectorized pass. With multi-stage assumptions the
+    solved growth is that of the first (high-growth) stage.
+    """
+    a = {**DEFAULT_ASSUMPTIONS, **(assumptions or {})}
+    inputs = model_inputs(model, stock_data_list, a)
+
+    if solve_for == 'revenue_growth':
+        value_fn = lambda x: model_per_share_vectorized(model, inputs, a, revenue_growth=x)
+        low, high = (-0.5 if low is None else low), (1.0 if high is None else high)
+    elif solve_for == 'discount_rate':
+        value_fn = lambda x: model_per_share_vectorized(model, inputs, a, discount_rate=x)
+        # Discount rates at or below terminal growth make the terminal value meaningless
+        low, high = (a['terminal_growth'] + 0.001 if low is None else low), (1.0 if high is None else high)
+    else:
+        raise ValueError(f"Unsupported solve_for {solve_for}")
+
+    return solve_implied_parameter(value_fn, np.asarray(prices, dtype=float), low, high)
+
+
+def calculate_all_models_vectorized(stock_data_list, assumptions):
+    """
+    Array counterpart of ValuationModels.calculate_all_models: one array per model
+    with a value per share for every stock_data dict, plus the weighted average.
+    """
+    a = {**DEFAULT_ASSUMPTIONS, **assumptions}
+    results = {
+        model: model_per_share_vectorized(model, model_inputs(model, stock_data_list, a), a)
+        for model in ('dcf', 'fcfe', 'ddm')
+    }
+
+    # Same rule as calculate_all_models: only positive values of weighted models count
+    model_weights = assumptions.get('model_weights', {'dcf': 0.5, 'fcfe': 0.5})
+    weighted_sum = np.zeros(len(stock_data_list))
+    total_weight = np.zeros(len(stock_data_list))
+    for model, weight in model_weights.items():
+        if model in results:
+            valid = results[model] > 0
+            weighted_sum += np.where(valid, results[model] * weight, 0)
+            total_weight += np.where(valid, weight, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results['weighted_average'] = np.where(total_weight > 0, weighted_sum / total_weight, 0.0)
+    return results
+
+
 class ValuationModels:
     """
     Financial valuation models for Vietnamese stocks
-    Implements DCF (FCFF) and FCFE models with proper calculations
+    Implements DCF (FCFF), FCFE and multi-stage DDM models with proper calculations
     """
     def __init__(self, stock_data=None):
         """Initialize with stock data from API"""
@@ -18,6 +371,7 @@ class ValuationModels:
         results = {
             'dcf': self.calculate_dcf(assumptions),
             'fcfe': self.calculate_fcfe(assumptions),
+            'ddm': self.calculate_dividend_discount(assumptions),
             'weighted_average': 0
         }
 
@@ -33,7 +387,27 @@ class ValuationModels:
                 ) / total_weight
 
         return results
+
+    def calculate_implied_parameter(self, assumptions, market_price, model='dcf', solve_for='revenue_growth'):
+        """
+        Reverse DCF for this stock: the revenue growth (or WACC / required return)
+        at which the model value per share equals market_price
+        """
+        result = implied_parameter_batch([self.stock_data], [market_price], assumptions, model, solve_for)
+        return {k: v[0].item() for k, v in result.items()}
+
+    def _calculate_multi_stage(self, model, assumptions):
+        """Value per share through the vectorized multi-stage engine for this one stock"""
+        inputs = model_inputs(model, [self.stock_data], assumptions)
+        return float(model_per_share_vectorized(model, inputs, assumptions)[0])
+
     def calculate_dcf(self, assumptions):
+        if assumptions.get('stages') or assumptions.get('fade_years', 0) > 0:
+            try:
+                return self._calculate_multi_stage('dcf', assumptions)
+            except Exception as e:
+                print(f"DCF calculation error: {e}")
+                return 0
         try:
             data = self.stock_data
             print("\n=== DCF CALCULATION STEPS ===")
@@ -44,6 +418,8 @@ class ValuationModels:
             wacc = assumptions.get('wacc', 0.10)
             tax_rate = assumptions.get('tax_rate', 0.20)
             projection_years = assumptions.get('projection_years', 5)
+            capex_rate = assumptions.get('capex_rate', 0.04)
+            working_capital_rate = assumptions.get('working_capital_rate', 0.02)
             
             print(f"Assumptions:")
             print(f"  Revenue Growth: {revenue_growth:.1%}")
@@ -82,8 +458,8 @@ class ValuationModels:
                 projected_ebit = projected_revenue * ebit_margin
                 ebit_after_tax = projected_ebit * (1 - tax_rate)
                 projected_depreciation = projected_revenue * depreciation_rate
-                projected_capex = projected_revenue * 0.04  # 4% of revenue
-                working_capital_change = projected_revenue * revenue_growth * 0.02  # 2% of revenue
+                projected_capex = projected_revenue * capex_rate  # 4% of revenue by default
+                working_capital_change = projected_revenue * revenue_growth * working_capital_rate  # 2% by default
 
                 fcff = ebit_after_tax + projected_depreciation - projected_capex - working_capital_change
                 fcff_projections.append(fcff)
@@ -113,7 +489,7 @@ class ValuationModels:
             terminal_ebit = terminal_revenue * ebit_margin
             terminal_ebit_after_tax = terminal_ebit * (1 - tax_rate)
             terminal_depreciation = terminal_revenue * depreciation_rate
-            terminal_capex = terminal_revenue * 0.04
+            terminal_capex = terminal_revenue * capex_rate
             terminal_fcff = terminal_ebit_after_tax + terminal_depreciation - terminal_capex
 
             terminal_value = terminal_fcff / (wacc - terminal_growth)
@@ -149,6 +525,12 @@ class ValuationModels:
         Calculate FCFE (Free Cash Flow to Equity) model
         Returns: value per share in VND
         """
+        if assumptions.get('stages') or assumptions.get('fade_years', 0) > 0:
+            try:
+                return self._calculate_multi_stage('fcfe', assumptions)
+            except Exception as e:
+                print(f"FCFE calculation error: {e}")
+                return 0
         try:
             data = self.stock_data
 
@@ -214,32 +596,13 @@ class ValuationModels:
 
     def calculate_dividend_discount(self, assumptions):
         """
-        Calculate Dividend Discount Model
-        Not currently used but kept for future implementation
+        Calculate multi-stage Dividend Discount Model
+        Dividends grow through the same stages as the other models (revenue_growth for
+        projection_years, optional fade) and then at terminal_growth forever.
+        Returns: value per share in VND
         """
         try:
-            data = self.stock_data
-
-            # Get assumptions
-            growth_rate = assumptions.get('revenue_growth', 0.08)
-            terminal_growth = assumptions.get('terminal_growth', 0.03)
-            required_return = assumptions.get('required_return_equity', 0.12)
-
-            # Get financial data
-            eps = data.get('earnings_per_share', 0)
-            dividend_payout_ratio = 0.3  # Assume 30% payout
-
-            # Calculate dividend per share
-            dividend_per_share = eps * dividend_payout_ratio
-
-            # Apply Gordon Growth Model
-            if required_return <= terminal_growth:
-                return 0
-
-            value_per_share = dividend_per_share * (1 + terminal_growth) / (required_return - terminal_growth)
-
-            return value_per_share
-
+            return self._calculate_multi_stage('ddm', assumptions)
         except Exception as e:
             print(f"DDM calculation error: {e}")
             return 0
@@ -277,4 +640,18 @@ if __name__ == "__main__":
 
     print("Testing Valuation Models with mock data:")
     for model, value in results.items():
-        print(f"{model.upper()}: {value:,.2f} VND per share")
\ No newline at end of file
+        print(f"{model.upper()}: {value:,.2f} VND per share")
+
+    # DCF-only stage keys must not change FCFE/DDM, and consecutive fades must value cleanly
+    plain = {**default_assumptions, 'stages': [{'years': 3, 'growth': 0.20}, {'years': 5, 'fade': True}]}
+    dcf_keys = {**default_assumptions, 'stages': [
+        {'years': 3, 'growth': 0.20, 'margin': 0.18, 'capex': 0.06, 'reinvestment': 0.05},
+        {'years': 5, 'fade': True}]}
+    assert models.calculate_fcfe(plain) == models.calculate_fcfe(dcf_keys)
+    assert models.calculate_dividend_discount(plain) == models.calculate_dividend_discount(dcf_keys)
+    split_fade = {**default_assumptions, 'stages': [
+        {'years': 3, 'growth': 0.20}, {'years': 2, 'fade': True}, {'years': 3, 'fade': True}]}
+    for model in ('dcf', 'fcfe', 'ddm'):
+        value = models._calculate_multi_stage(model, split_fade)
+        assert abs(value - models._calculate_multi_stage(model, plain)) <= 1e-6 * value
+    print("Multi-stage checks passed")
\ No newline at end of file